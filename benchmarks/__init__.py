@@ -0,0 +1,3 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
@@ -0,0 +1,87 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import docutils
+import json
+import platform
+import sys
+
+from argparse import ArgumentParser
+from fnmatch import fnmatch
+
+from .doctrees import count, doctree
+from .suite import benchmarks, run
+
+
+def main(argv=None):
+    parser = ArgumentParser(
+        prog='python -m benchmarks',
+        description="Time docpath parsing and evaluation on synthetic "
+                    "doctrees.")
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+        help="the approximate number of nodes in each doctree")
+    parser.add_argument(
+        '--depth', type=int, nargs='+', default=[4],
+        help="the maximum depth of the sections in each doctree")
+    parser.add_argument(
+        '--fanout', type=int, nargs='+', default=[8],
+        help="the number of child sections of each section")
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help="the number of times to repeat each benchmark")
+    parser.add_argument(
+        '--number', type=int, default=1,
+        help="the number of calls in each repeat")
+    parser.add_argument(
+        '--filter', default='*',
+        help="only run the benchmarks whose 'group:name' matches this glob")
+    parser.add_argument(
+        '--label', default=None,
+        help="a label, such as a release, to store with the results")
+    parser.add_argument(
+        '--output', default=None,
+        help="the file to write the JSON results to, instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes:
+        for depth in args.depth:
+            for fanout in args.fanout:
+                document = doctree(size, depth, fanout)
+                nodes = count(document)
+                for group, name, function in benchmarks(document):
+                    if not fnmatch('{}:{}'.format(group, name), args.filter):
+                        continue
+                    result = run(function, args.repeat, args.number)
+                    result.update({
+                        'group': group,
+                        'name': name,
+                        'size': size,
+                        'depth': depth,
+                        'fanout': fanout,
+                        'nodes': nodes,
+                        })
+                    results.append(result)
+                    print(
+                        "{group:8} {nodes:>8} {depth:>3} {fanout:>4} "
+                        "{best:12.6f} {name}".format(**result),
+                        file=sys.stderr)
+
+    report = {
+        'label': args.label,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'docutils': docutils.__version__,
+        'results': results,
+        }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from collections import deque
+from docpath.axis import DescendantOrSelf
+from docutils import nodes
+from docutils.utils import new_document
+
+
+def doctree(size, depth, fanout):
+    document = new_document('<benchmark>')
+    total = 1
+    sections = 0
+
+    parents = deque()
+    while total < size:
+        if parents:
+            parent, level = parents.popleft()
+        else:
+            parent, level = document, 0
+
+        for _ in range(fanout):
+            sections += 1
+            section = section_node(sections)
+            parent.append(section)
+            document.note_implicit_target(section)
+            total += count(section)
+            if level + 1 < depth:
+                parents.append((section, level + 1))
+            if total >= size:
+                break
+
+    return document
+
+
+def section_node(number):
+    name = 'section-{}'.format(number)
+    return nodes.section(
+        '',
+        nodes.title('', 'Section {}'.format(number)),
+        nodes.paragraph(
+            '',
+            nodes.Text('Paragraph {} with '.format(number)),
+            nodes.emphasis('', 'emphasis'),
+            nodes.Text(' and a '),
+            nodes.reference(
+                '', 'reference', refuri='https://example.com/{}'.format(
+                    number))),
+        ids=[name], names=[name])
+
+
+def count(node):
+    return sum(1 for _ in DescendantOrSelf.traverse(node))
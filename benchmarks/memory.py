@@ -0,0 +1,61 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import json
+import sys
+import tracemalloc
+
+from argparse import ArgumentParser
+from docpath.parser import DocpathParser
+
+from .suite import queries
+
+
+def measure(count, compile):
+    docpaths = []
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        query = queries[i % len(queries)]
+        docpath = DocpathParser.parse('{}/child::rule{}'.format(query, i))
+        if compile:
+            docpath.plan
+            compile_predicates(docpath.plan)
+        docpaths.append(docpath)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / count
+
+
+def compile_predicates(steps):
+    if isinstance(steps, (list, tuple)):
+        for step in steps:
+            compile_predicates(step)
+    elif hasattr(steps, 'compiled'):
+        steps.compiled
+
+
+def main(argv=None):
+    parser = ArgumentParser(
+        prog='python -m benchmarks.memory',
+        description="Measure the memory used by each compiled docpath.")
+    parser.add_argument(
+        '--count', type=int, default=10000,
+        help="the number of docpaths to create")
+    parser.add_argument(
+        '--label', default=None,
+        help="a label, such as a release, to store with the results")
+    args = parser.parse_args(argv)
+
+    report = {
+        'label': args.label,
+        'count': args.count,
+        'parsed': measure(args.count, False),
+        'compiled': measure(args.count, True),
+        }
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
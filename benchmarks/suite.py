@@ -0,0 +1,72 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from collections import deque
+from docpath import path
+from docpath.axis import Axis
+from docpath.parser import DocpathParser
+from timeit import Timer
+
+
+queries = [
+    '//section',
+    '//section/title',
+    '//section//reference',
+    '//text',
+    '//paragraph[emphasis]',
+    '//reference[@refuri]',
+    '//section[title == "Section 5"]',
+    '//section[count(section) > 1]',
+    '//section[1]',
+    '//section[last()]',
+    '//section[position() < 3]',
+    '//section[section and not(paragraph/reference)]',
+    '(//title|//emphasis)',
+    '//section/(title|paragraph)',
+    '//title/following_sibling::paragraph',
+    '//reference/ancestor::section',
+    '//*[@ids == "section-5"]',
+    'id("section-5")/title',
+    ]
+
+
+def benchmarks(document):
+    middle = document.children[len(document.children) // 2]
+
+    for query in queries:
+        yield 'parse', query, parse(query)
+
+    for name in sorted(Axis.axes()):
+        yield 'axis', name, traverse(Axis(name), middle)
+
+    for query in queries:
+        docpath = path(query)
+        yield 'findall', query, findall(docpath, document)
+        yield 'find', query, find(docpath, document)
+
+
+def parse(query):
+    return lambda: DocpathParser.parse(query)
+
+
+def traverse(axis, node):
+    return lambda: deque(axis.traverse(node), maxlen=0)
+
+
+def findall(docpath, node):
+    return lambda: deque(docpath.findall(node), maxlen=0)
+
+
+def find(docpath, node):
+    return lambda: docpath.find(node)
+
+
+def run(function, repeat, number):
+    function()
+    times = [t / number for t in Timer(function).repeat(repeat, number)]
+    return {
+        'best': min(times),
+        'mean': sum(times) / len(times),
+        'repeat': repeat,
+        'number': number,
+        }
@@ -1,7 +1,14 @@
 # This file is part of the docpath package.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
-from .parser import path
+from .batch import DocpathBatch
+from .docpathset import DocpathSet
+from .index import DocumentIndex, DocumentOrder
+from .parser import path, path_cache
+from .profile import DocpathProfile
+from .version import __version__
 
 
-__all__ = ['path']
+__all__ = [
+    'DocpathBatch', 'DocpathProfile', 'DocpathSet', 'DocumentIndex',
+    'DocumentOrder', '__version__', 'path', 'path_cache']
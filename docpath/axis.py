@@ -1,20 +1,34 @@
 # This file is part of the docpath package.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
+from weakref import WeakKeyDictionary
 
 
 class Axis(object):
+    __slots__ = ()
+
+    _forward = True
+    _reverse = False
+
+    _instances = {}
+    _positions = WeakKeyDictionary()
 
     def __new__(cls, name):
-        axes = cls.axes()
-        if name not in axes:
-            raise ValueError
-        return super().__new__(axes[name])
+        axis = Axis._instances.get(name)
+        if axis is None:
+            axes = cls.axes()
+            if name not in axes:
+                raise ValueError
+            axis = Axis._instances[name] = super().__new__(axes[name])
+        return axis
 
     def __getattr__(self, name):
         from .docpath import Docpath, DocpathStep
         return Docpath(DocpathStep(self, name))
 
+    def __reduce__(self):
+        return Axis, (self._name,)
+
     def __repr__(self):
         return 'Axis(\'{}\')'.format(self)
 
@@ -26,206 +40,307 @@ class Axis(object):
         return {a._name: a for a in Axis.__subclasses__()}
 
     @classmethod
-    def node_address(cls, node):
-        address = []
-        for ancestor, _ in AncestorOrSelf.traverse_backwards(node, ()):
-            if not ancestor.parent:
-                address.append(1)
-            else:
-                address.append(ancestor.parent.index(ancestor))
-        return tuple(address)
+    def node_position(cls, node):
+        parent = node.parent
+        if parent is None:
+            return None
+
+        positions = cls._positions.get(parent)
+        if positions is not None:
+            position = positions.get(id(node))
+            if position is not None and position < len(parent.children) \
+                    and parent.children[position] is node:
+                return position
+
+        positions = {id(c): i for i, c in enumerate(parent.children)}
+        cls._positions[parent] = positions
+        return positions.get(id(node))
 
     @classmethod
-    def traverse(cls, node, address):
+    def invalidate_positions(cls, parent):
+        cls._positions.pop(parent, None)
+
+    @classmethod
+    def traverse(cls, node):
         raise NotImplementedError
 
     @classmethod
-    def traverse_backwards(cls, node, address):
-        for node, address in reversed(list(cls.traverse(node, address))):
-            yield node, address
+    def traverse_backwards(cls, node):
+        yield from reversed(list(cls.traverse(node)))
 
 
 class Ancestor(Axis):
+    __slots__ = ()
     _name = 'ancestor'
+    _forward = False
     _reverse = True
 
     @classmethod
-    def traverse(cls, node, address):
-        while node.parent:
+    def traverse(cls, node):
+        while node.parent is not None:
             node = node.parent
-            address = address[:-1]
-            yield node, address
-
-    @classmethod
-    def traverse_backwards(cls, node, address):
-        yield from reversed(list(cls.traverse(node, address)))
+            yield node
 
 
 class AncestorOrSelf(Axis):
+    __slots__ = ()
     _name = 'ancestor_or_self'
+    _forward = False
     _reverse = True
 
     @classmethod
-    def traverse(cls, node, address):
-        yield node, address
-        yield from Ancestor.traverse(node, address)
+    def traverse(cls, node):
+        yield node
+        yield from Ancestor.traverse(node)
 
     @classmethod
-    def traverse_backwards(cls, node, address):
-        yield from Ancestor.traverse_backwards(node, address)
-        yield node, address
+    def traverse_backwards(cls, node):
+        yield from Ancestor.traverse_backwards(node)
+        yield node
 
 
 class Attribute(Axis):
+    __slots__ = ()
     _name = 'attribute'
 
-    class Node:
-        def __init__(self, name, value):
+    class Node(object):
+        __slots__ = ('name', 'value', 'parent', '_source', '_text')
+
+        children = ()
+
+        def __init__(self, name, value, parent=None):
             self.name = name
             self.value = value
+            self.parent = parent
+            self._text = None
 
         def astext(self):
-            if isinstance(self.value, (list, tuple)):
-                return ' '.join(self.value)
-            else:
-                return str(self.value)
+            # The text of list values is kept until the list is changed.
+            value = self.value
+            if self._text is None or self._source != value:
+                if isinstance(value, (list, tuple)):
+                    self._source = list(value)
+                    self._text = ' '.join(value)
+                else:
+                    self._source = value
+                    self._text = str(value)
+            return self._text
+
+    @classmethod
+    def traverse(cls, node):
+        for name, value in getattr(node, 'attributes', {}).items():
+            yield cls.Node(name, value, node)
 
     @classmethod
-    def traverse(cls, node, address):
-        for i, (name, value) in enumerate(node.attributes.items()):
-            yield cls.Node(name, value), address + (i,)
+    def traverse_name(cls, node, name):
+        attributes = getattr(node, 'attributes', None)
+        if attributes and name in attributes:
+            return (cls.Node(name, attributes[name], node),)
+        return ()
 
 
 class Child(Axis):
+    __slots__ = ()
     _name = 'child'
 
     @classmethod
-    def traverse(cls, node, address):
-        for i, child in enumerate(node.children):
-            yield child, address + (i,)
+    def traverse(cls, node):
+        yield from node.children
 
     @classmethod
-    def traverse_backwards(cls, node, address):
-        for i, child in reversed(list(enumerate(node.children))):
-            yield child, address + (i,)
+    def traverse_backwards(cls, node):
+        yield from reversed(node.children)
 
 
 class Descendant(Axis):
+    __slots__ = ()
     _name = 'descendant'
 
     @classmethod
-    def traverse(cls, node, address):
-        for child_address in Child.traverse(node, address):
-            yield child_address
-            yield from cls.traverse(*child_address)
+    def traverse(cls, node):
+        stack = [iter(node.children)]
+        while stack:
+            for child in stack[-1]:
+                yield child
+                if child.children:
+                    stack.append(iter(child.children))
+                    break
+            else:
+                stack.pop()
 
     @classmethod
-    def traverse_backwards(cls, node, address):
-        for child_address in Child.traverse_backwards(node, address):
-            yield from cls.traverse_backwards(*child_address)
-            yield child_address
+    def traverse_backwards(cls, node):
+        stack = [(reversed(node.children), None)]
+        while stack:
+            children, parent = stack[-1]
+            for child in children:
+                if child.children:
+                    stack.append((reversed(child.children), child))
+                    break
+                yield child
+            else:
+                stack.pop()
+                if parent is not None:
+                    yield parent
 
 
 class DescendantOrSelf(Axis):
+    __slots__ = ()
     _name = 'descendant_or_self'
 
     @classmethod
-    def traverse(cls, node, address):
-        yield node, address
-        yield from Descendant.traverse(node, address)
+    def traverse(cls, node):
+        yield node
+        yield from Descendant.traverse(node)
 
     @classmethod
-    def traverse_backwards(cls, node, address):
-        yield from Descendant.traverse_backwards(node, address)
-        yield node, address
+    def traverse_backwards(cls, node):
+        yield from Descendant.traverse_backwards(node)
+        yield node
 
 
 class Following(Axis):
+    __slots__ = ()
     _name = 'following'
 
     @classmethod
-    def traverse(cls, node, address):
-        for ancestor in AncestorOrSelf.traverse(node, address):
-            for sibling in FollowingSibling.traverse(*ancestor):
+    def traverse(cls, node):
+        for ancestor in AncestorOrSelf.traverse(node):
+            for sibling in FollowingSibling.traverse(ancestor):
+                yield sibling
+                yield from Descendant.traverse(sibling)
+
+    @classmethod
+    def traverse_backwards(cls, node):
+        for ancestor in AncestorOrSelf.traverse_backwards(node):
+            for sibling in FollowingSibling.traverse_backwards(ancestor):
+                yield from Descendant.traverse_backwards(sibling)
                 yield sibling
-                yield from Descendant.traverse(*sibling)
 
 
 class FollowingSibling(Axis):
+    __slots__ = ()
     _name = 'following_sibling'
 
     @classmethod
-    def traverse(cls, node, address):
-        if node.parent:
-            index = node.parent.index(node)
-            siblings = node.parent.children[index+1:]
-            for i, sibling in enumerate(siblings):
-                yield sibling, address[:-1] + (index + i + 1,)
+    def traverse(cls, node):
+        position = cls.node_position(node)
+        if position is not None:
+            children = node.parent.children
+            for i in range(position + 1, len(children)):
+                yield children[i]
+
+    @classmethod
+    def traverse_backwards(cls, node):
+        position = cls.node_position(node)
+        if position is not None:
+            children = node.parent.children
+            for i in range(len(children) - 1, position, -1):
+                yield children[i]
+
+
+class Id(Axis):
+    __slots__ = ()
+    _name = 'id'
+    _forward = False
+
+    @staticmethod
+    def _document(node):
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    @classmethod
+    def traverse(cls, node):
+        document = cls._document(node)
+        identified = set(map(id, getattr(document, 'ids', {}).values()))
+        for descendant in DescendantOrSelf.traverse(document):
+            if id(descendant) in identified:
+                yield descendant
+
+    @classmethod
+    def traverse_name(cls, node, name):
+        # The ids of the document can still contain nodes that have been
+        # removed from it.
+        document = cls._document(node)
+        found = getattr(document, 'ids', {}).get(name)
+        if found is None or cls._document(found) is not document:
+            return ()
+        return (found,)
 
 
 class Parent(Axis):
+    __slots__ = ()
     _name = 'parent'
+    _forward = False
     _reverse = True
 
     @classmethod
-    def traverse(cls, node, address):
-        if node.parent:
-            yield node.parent, address[:-1]
+    def traverse(cls, node):
+        if node.parent is not None:
+            yield node.parent
 
     @classmethod
-    def traverse_backwards(cls, node, address):
-        yield from cls.traverse(node, address)
+    def traverse_backwards(cls, node):
+        yield from cls.traverse(node)
 
 
 class Preceding(Axis):
+    __slots__ = ()
     _name = 'preceding'
+    _forward = False
     _reverse = True
 
     @classmethod
-    def traverse(cls, node, address):
-        for ancestor in AncestorOrSelf.traverse(node, address):
-            for sibling in PrecedingSibling.traverse(*ancestor):
-                yield from DescendantOrSelf.traverse_backwards(*sibling)
+    def traverse(cls, node):
+        for ancestor in AncestorOrSelf.traverse(node):
+            for sibling in PrecedingSibling.traverse(ancestor):
+                yield from DescendantOrSelf.traverse_backwards(sibling)
 
     @classmethod
-    def traverse_backwards(cls, node, address):
-        for ancestor in AncestorOrSelf.traverse_backwards(node, address):
-            for sibling in PrecedingSibling.traverse_backwards(*ancestor):
-                yield from DescendantOrSelf.traverse(*sibling)
+    def traverse_backwards(cls, node):
+        for ancestor in AncestorOrSelf.traverse_backwards(node):
+            for sibling in PrecedingSibling.traverse_backwards(ancestor):
+                yield from DescendantOrSelf.traverse(sibling)
 
 
 class PrecedingSibling(Axis):
+    __slots__ = ()
     _name = 'preceding_sibling'
+    _forward = False
     _reverse = True
 
     @classmethod
-    def traverse(cls, node, address):
-        if node.parent:
-            index = node.parent.index(node)
-            siblings = node.parent.children[:index]
-            for i, sibling in reversed(list(enumerate(siblings))):
-                yield sibling, address[:-1] + (i,)
+    def traverse(cls, node):
+        position = cls.node_position(node)
+        if position is not None:
+            children = node.parent.children
+            for i in range(position - 1, -1, -1):
+                yield children[i]
 
     @classmethod
-    def traverse_backwards(cls, node, address):
-        if node.parent:
-            index = node.parent.index(node)
-            siblings = node.parent.children[:index]
-            for i, sibling in enumerate(siblings):
-                yield sibling, address[:-1] + (i,)
+    def traverse_backwards(cls, node):
+        position = cls.node_position(node)
+        if position is not None:
+            children = node.parent.children
+            for i in range(position):
+                yield children[i]
 
 
 class Root(Axis):
+    __slots__ = ()
     _name = 'root'
+    _forward = False
 
     @classmethod
-    def traverse(cls, node, address):
-        yield node.document, (1,)
+    def traverse(cls, node):
+        yield node.document
 
 
 class Self(Axis):
+    __slots__ = ()
     _name = 'self'
 
     @classmethod
-    def traverse(cls, node, address):
-        yield node, address
+    def traverse(cls, node):
+        yield node
@@ -0,0 +1,150 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import os
+import pickle
+
+from collections import deque
+from itertools import islice
+
+from .axis import Attribute, DescendantOrSelf
+from .docpath import Docpath
+from .docpathset import DocpathSet
+
+
+class DocpathBatch(object):
+
+    pickle_suffixes = ('.doctree', '.pickle', '.pkl')
+
+    def __init__(self, docpaths, projection='address', max_workers=None,
+                 chunksize=1, settings=None):
+        if isinstance(docpaths, Docpath):
+            docpaths = [docpaths]
+            self.single = True
+        else:
+            docpaths = list(docpaths)
+            self.single = False
+
+        if not callable(projection) and projection not in projections:
+            raise ValueError("invalid projection: {}".format(projection))
+        if max_workers is not None and max_workers < 0:
+            raise ValueError("invalid number of workers: {}".format(
+                max_workers))
+        if chunksize < 1:
+            raise ValueError("invalid chunk size: {}".format(chunksize))
+
+        self.docpaths = DocpathSet(docpaths)
+        self.projection = projection
+        self.max_workers = max_workers
+        self.chunksize = chunksize
+        self.settings = settings
+
+    def evaluate(self, documents):
+        tasks = (
+            (self.docpaths, self.single, self.projection, self.settings,
+             document)
+            for document in documents)
+
+        if self.max_workers == 0:
+            yield from map(evaluate_document, tasks)
+            return
+
+        # Docutils and the process pool are only imported when they are
+        # used, so importing docpath stays fast.
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Only a few chunks of documents are waiting for a process at any
+        # time, so the documents are not all pickled and queued up front.
+        window = 2 * (self.max_workers or os.cpu_count() or 1)
+        chunks = iter(lambda: list(islice(tasks, self.chunksize)), [])
+        pending = deque()
+        with ProcessPoolExecutor(self.max_workers) as executor:
+            for chunk in chunks:
+                if len(pending) >= window:
+                    yield from pending.popleft().result()
+                pending.append(executor.submit(evaluate_documents, chunk))
+            while pending:
+                yield from pending.popleft().result()
+
+    @classmethod
+    def load(cls, source, settings=None):
+        from docutils.core import publish_doctree
+        from docutils.nodes import Node
+
+        if isinstance(source, Node):
+            return source
+
+        source = str(source)
+        if source.endswith(cls.pickle_suffixes):
+            with open(source, 'rb') as file:
+                return pickle.load(file)
+
+        with open(source, 'r', encoding='utf-8') as file:
+            return publish_doctree(
+                file.read(), source_path=source,
+                settings_overrides=settings)
+
+
+def evaluate_document(task):
+    docpaths, single, projection, settings, document = task
+    document = DocpathBatch.load(document, settings)
+    if not callable(projection):
+        projection = projections[projection]
+
+    # Nodes are projected with their position in a preorder traversal of
+    # the document, and attribute nodes with the position of their element.
+    # Only the projections that use the position need it to be found.
+    positions = None
+    if projection is project_address or \
+            projection not in projections.values():
+        positions = {
+            id(node): position for position, node in enumerate(
+                DescendantOrSelf.traverse(document))}
+
+    def address(node):
+        if positions is None:
+            return None
+        if isinstance(node, Attribute.Node):
+            node = node.parent
+        return positions[id(node)]
+
+    results = [
+        [projection(node, address(node)) for node in nodes]
+        for nodes in docpaths.findall(document)]
+    return results[0] if single else results
+
+
+def evaluate_documents(tasks):
+    return [evaluate_document(task) for task in tasks]
+
+
+def project_address(node, address):
+    return address
+
+
+def project_attributes(node, address):
+    if isinstance(node, Attribute.Node):
+        attributes = {node.name: node.value}
+    else:
+        attributes = getattr(node, 'attributes', {})
+    return {
+        name: list(value) if isinstance(value, list) else value
+        for name, value in attributes.items()}
+
+
+def project_name(node, address):
+    if isinstance(node, Attribute.Node):
+        return node.name
+    return node.__class__.__name__
+
+
+def project_text(node, address):
+    return node.astext()
+
+
+projections = {
+    'address': project_address,
+    'attributes': project_attributes,
+    'name': project_name,
+    'text': project_text,
+}
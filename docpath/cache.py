@@ -0,0 +1,156 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import os
+import pickle
+
+from collections import OrderedDict, namedtuple
+from tempfile import NamedTemporaryFile
+from threading import Event, RLock
+
+from .docpath import Docpath
+from .version import __version__
+
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+
+class PathCache(object):
+
+    def __init__(self, parser, maxsize=1024):
+        self.parser = parser
+        self._maxsize = maxsize
+        self._lock = RLock()
+        self._parsing = {}
+        self._entries = OrderedDict()
+        self._aliases = {}
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, docpath):
+        with self._lock:
+            key = self._aliases.get(docpath)
+            if key is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return self._entries[key][0]
+
+        # Each docpath is only parsed by one thread at a time, other threads
+        # that need the same docpath wait for it to be parsed, but docpaths
+        # that are different are parsed at the same time.
+        key = self.parser.normalize(docpath)
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self._add_alias(key, docpath)
+                    self._hits += 1
+                    return self._entries[key][0]
+                parsing = self._parsing.get(key)
+                if parsing is None:
+                    parsing = self._parsing[key] = Event()
+                    self._misses += 1
+                    break
+            parsing.wait()
+
+        result = None
+        try:
+            result = self.parser.parse(docpath)
+        finally:
+            with self._lock:
+                del self._parsing[key]
+                if result is not None and self._maxsize != 0:
+                    self._entries[key] = (result, [])
+                    self._add_alias(key, docpath)
+                    self._evict()
+            parsing.set()
+        return result
+
+    def _add_alias(self, key, docpath):
+        if docpath not in self._aliases:
+            self._aliases[docpath] = key
+            self._entries[key][1].append(docpath)
+
+    def _evict(self):
+        if self._maxsize is None:
+            return
+        while len(self._entries) > self._maxsize:
+            _, (_, aliases) = self._entries.popitem(last=False)
+            for alias in aliases:
+                del self._aliases[alias]
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(
+                self._hits, self._misses, self._maxsize, len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def load(self, filename):
+        # Files saved by a different version of docpath are ignored, as are
+        # files that are missing or cannot be read, or whose entries are not
+        # docpaths and their aliases.
+        try:
+            with open(filename, 'rb') as file:
+                version, entries = pickle.load(file)
+            if version != __version__:
+                return 0
+            entries = [
+                (key, aliases, result) for key, aliases, result in entries]
+            if not all(
+                    isinstance(key, str) and isinstance(aliases, list) and
+                    all(isinstance(alias, str) for alias in aliases) and
+                    isinstance(result, Docpath)
+                    for key, aliases, result in entries):
+                return 0
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError,
+                ImportError, IndexError, TypeError, ValueError):
+            return 0
+
+        with self._lock:
+            if self._maxsize == 0:
+                return 0
+            for key, aliases, result in entries:
+                if key not in self._entries:
+                    self._entries[key] = (result, [])
+                for alias in aliases:
+                    self._add_alias(key, alias)
+            self._evict()
+        return len(entries)
+
+    def save(self, filename):
+        with self._lock:
+            entries = [
+                (key, list(aliases), result)
+                for key, (result, aliases) in self._entries.items()]
+        data = pickle.dumps((__version__, entries), pickle.HIGHEST_PROTOCOL)
+
+        # The file is written under a temporary name and then renamed, so
+        # other processes only ever see a complete file.
+        directory = os.path.dirname(os.path.abspath(filename))
+        file = NamedTemporaryFile(
+            'wb', dir=directory, prefix='.docpath-', delete=False)
+        try:
+            with file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(file.name, filename)
+        except BaseException:
+            os.unlink(file.name)
+            raise
+
+    def resize(self, maxsize):
+        if maxsize is not None and maxsize < 0:
+            raise ValueError("invalid cache size: {}".format(maxsize))
+        with self._lock:
+            self._maxsize = maxsize
+            self._evict()
@@ -1,17 +1,28 @@
 # This file is part of the docpath package.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
-from itertools import chain
+from heapq import heappop, heappush, heapreplace, merge
+from itertools import count, tee
 from operator import itemgetter
 
-from .axis import Attribute, Axis
-from .predicate import Predicate
+from .axis import (
+    Attribute, Axis, Descendant, DescendantOrSelf, Id, Root)
+from .index import DocumentIndex, DocumentOrder
+from .predicate import Predicate, TextCache
 
 
 class Docpath(object):
+    __slots__ = ('_steps', '_plan')
+
+    optimize = True
+    use_document_ids = True
 
     def __init__(self, steps):
-        self.steps = steps
+        self._steps = steps
+        self._plan = None
+
+    def __reduce__(self):
+        return Docpath, (self._steps,)
 
     def __truediv__(self, other):
         Predicate = self._get_predicate_class()
@@ -76,55 +87,204 @@ class Docpath(object):
     def _get_predicate_class(self):
         return Predicate
 
+    @property
+    def steps(self):
+        return self._steps
+
+    @property
+    def absolute(self):
+        return self._absolute(self.steps)
+
+    @classmethod
+    def _absolute(cls, steps):
+        if isinstance(steps, DocpathStep):
+            return isinstance(steps.axis, (Id, Root))
+        if isinstance(steps, tuple):
+            return all(cls._absolute(s) for s in steps)
+        return bool(steps) and cls._absolute(steps[0])
+
     def find(self, from_node):
         return next(self.findall(from_node), None)
 
     def findall(self, from_node):
-        node_addresses = list(self.traverse(from_node))
-        node_addresses = sorted(node_addresses, key=itemgetter(1))
-        return map(itemgetter(0), node_addresses)
-
-    def traverse(self, from_node):
-        from_address = Axis.node_address(from_node)
+        return map(itemgetter(0), self.traverse(from_node))
+
+    @property
+    def plan(self):
+        if not self.optimize:
+            return self.steps
+        if self._plan is None:
+            from .optimizer import DocpathOptimizer
+            self._plan = DocpathOptimizer.optimize(self.steps)
+        return self._plan
+
+    def explain(self, document=None, file=None):
+        from .explain import DocpathExplainer
+        print(DocpathExplainer.explain(self, document), file=file)
+
+    def traverse(self, from_node, profile=None):
+        yield from self._traverse_from(from_node, profile)
+
+    def _traverse_from(self, from_node, profile=None, texts=None):
+        # Docpaths in predicates are traversed with the text cache, and the
+        # document order, of the query that they are part of.
+        if texts is None:
+            texts = TextCache()
+        if texts.order is None:
+            texts.order = DocumentOrder.get(from_node)
+        order = texts.order
+        from_address = order.key(from_node)
+        if profile is not None:
+            profile.add(self.plan)
         yield from self._traverse(
-            self.steps, None, [(from_node, from_address)])
+            self.plan, None, iter([(from_node, from_address)]), order,
+            profile, texts)
 
-    def _traverse(self, steps, predicates, node_addresses):
+    def _traverse(self, steps, predicates, node_addresses, order,
+                  profile=None, texts=None):
         result = None
         if isinstance(steps, DocpathStep):
-            result = self._traverse_docpath(steps, predicates, node_addresses)
+            result = self._traverse_docpath(
+                steps, predicates, node_addresses, order, profile, texts)
         elif isinstance(steps, tuple):
-            result = self._traverse_tuple(steps, predicates, node_addresses)
+            result = self._traverse_tuple(
+                steps, predicates, node_addresses, order, profile, texts)
         elif isinstance(steps, list):
-            result = self._traverse_list(steps, predicates, node_addresses)
+            result = self._traverse_list(
+                steps, predicates, node_addresses, order, profile, texts)
         else:
             raise ValueError("invalid path step: {}".format(steps))
         yield from result
 
-    def _traverse_docpath(self, step, predicates, node_addresses):
-        Predicate = self._get_predicate_class()
+    def _traverse_docpath(self, step, predicates, node_addresses, order,
+                          profile=None, texts=None):
+        filter_nodes = self._get_filter_nodes(profile, texts)
+        reverse = step.axis._reverse
+
+        stats = None
+        if profile is not None:
+            stats = profile.step(step)
+            node_addresses = stats.count_contexts(node_addresses)
+
+        lookup = None
+        if predicates and self.use_document_ids and \
+                isinstance(step.axis, (Descendant, DescendantOrSelf)):
+            lookup = predicates[0].compiled.lookup
+
+        def traverse(node):
+            if lookup is not None:
+                nodes = step.lookup(node, order, *lookup, stats=stats)
+                if nodes is not None:
+                    return iter(filter_nodes(predicates, nodes))
+            if reverse and not predicates:
+                return step.traverse(node, order, True, stats)
+
+            result = filter_nodes(
+                predicates, step.traverse(node, order, False, stats))
+            if reverse:
+                result = reversed(list(result))
+            return iter(result)
+
+        if not predicates and isinstance(
+                step.axis, (Descendant, DescendantOrSelf)):
+            node_addresses = self._outermost(node_addresses, order)
+
+        result = self._unique(
+            self._merge(node_addresses, traverse, step.axis._forward))
+        if stats is not None:
+            result = stats.count_results(result)
+        return result
 
-        result = []
+    def _get_filter_nodes(self, profile, texts=None):
+        if profile is not None:
+            filter_nodes = profile.filter_nodes
+        else:
+            filter_nodes = self._get_predicate_class().filter_nodes
+        return lambda predicates, node_addresses: filter_nodes(
+            predicates, node_addresses, texts)
+
+    @staticmethod
+    def _outermost(node_addresses, order):
+        # Context nodes inside the subtree of an earlier context node only
+        # produce descendants that have already been found.
+        end = None
         for node, address in node_addresses:
-            result.append(
-                Predicate.filter_nodes(
-                    predicates,
-                    step.filter_nodes(
-                        step.axis.traverse(node, address))))
-
-        return chain(*result)
+            if isinstance(node, Attribute.Node):
+                yield node, address
+            elif end is None or address > end:
+                yield node, address
+                end = order.end(address)
+
+    @staticmethod
+    def _unique(node_addresses):
+        # Duplicate nodes are next to each other in document order, only
+        # attribute nodes can share an address with a different node.
+        last_address = last_identity = seen = None
+        for node, address in node_addresses:
+            if isinstance(node, Attribute.Node):
+                identity = (id(node.parent), node.name)
+            else:
+                identity = id(node)
+
+            if address != last_address:
+                last_address, last_identity, seen = address, identity, None
+            elif identity == last_identity or (
+                    seen is not None and identity in seen):
+                continue
+            elif seen is None:
+                seen = set((last_identity, identity))
+            else:
+                seen.add(identity)
+            yield node, address
+
+    @staticmethod
+    def _merge(node_addresses, traverse, forward):
+        # Merges the document ordered results from each of the document
+        # ordered context nodes.  Results from forward axes never come before
+        # their context node, so a context node's results are only started
+        # once they could be the next result.
+        heap = []
+        contexts = count()
+        pending = next(node_addresses, None)
+        while True:
+            while pending is not None and (
+                    not forward or not heap or pending[1] <= heap[0][0]):
+                results = traverse(pending[0])
+                result = next(results, None)
+                if result is not None:
+                    heappush(
+                        heap, (result[1], next(contexts), result, results))
+                pending = next(node_addresses, None)
+
+            if not heap:
+                return
+
+            _, context, result, results = heap[0]
+            yield result
+
+            result = next(results, None)
+            if result is None:
+                heappop(heap)
+            else:
+                heapreplace(heap, (result[1], context, result, results))
 
-    def _traverse_tuple(self, steps, predicates, node_addresses):
-        Predicate = self._get_predicate_class()
+    def _traverse_tuple(self, steps, predicates, node_addresses, order,
+                        profile=None, texts=None):
+        filter_nodes = self._get_filter_nodes(profile, texts)
 
         result = []
-        for step in steps:
-            result.append(self._traverse(step, None, node_addresses))
+        for step, step_node_addresses in zip(
+                steps, tee(node_addresses, len(steps))):
+            result.append(self._traverse(
+                step, None, step_node_addresses, order, profile, texts))
 
-        return Predicate.filter_nodes(predicates, chain(*result))
+        return filter_nodes(
+            predicates, self._unique(merge(*result, key=itemgetter(1))))
 
-    def _traverse_list(self, steps, predicates, node_addresses):
+    def _traverse_list(self, steps, predicates, node_addresses, order,
+                       profile=None, texts=None):
         Predicate = self._get_predicate_class()
+        filter_nodes = self._get_filter_nodes(profile, texts)
 
         steps_with_predicates = []
         for step in steps:
@@ -134,17 +294,22 @@ class Docpath(object):
             else:
                 steps_with_predicates.append((step, []))
 
-        for step_predicates in steps_with_predicates:
-            node_addresses = self._traverse(*step_predicates, node_addresses)
+        for step, step_predicates in steps_with_predicates:
+            node_addresses = self._traverse(
+                step, step_predicates, node_addresses, order, profile, texts)
 
-        return Predicate.filter_nodes(predicates, node_addresses)
+        return filter_nodes(predicates, node_addresses)
 
 
 class DocpathStep(object):
+    __slots__ = ('_axis', '_node_test', '_compiled')
+
+    match_subclasses = False
 
     def __init__(self, axis, node_test):
-        self.axis = axis
-        self.node_test = node_test
+        self._axis = axis
+        self._node_test = node_test
+        self._compiled = None
 
     def __repr__(self):
         return 'DocpathStep(\'{}\')'.format(self)
@@ -152,17 +317,133 @@ class DocpathStep(object):
     def __str__(self):
         return '{}::{}'.format(self.axis, self.node_test)
 
-    def filter_nodes(self, node_addresses):
-        return filter(self.perform_node_test, node_addresses)
-
-    def perform_node_test(self, node_address):
-        node, _ = node_address
-        if isinstance(node, Attribute.Node):
-            return self.node_test == node.name
-        if self.node_test == 'node':
-            return True
-        if self.node_test == 'element':
-            return node.__class__.__name__ not in ['Text', 'comment']
-        if self.node_test == 'text':
-            return node.__class__.__name__ == 'Text'
-        return self.node_test == node.__class__.__name__
+    def __reduce__(self):
+        return DocpathStep, (self._axis, self._node_test)
+
+    @property
+    def axis(self):
+        return self._axis
+
+    @property
+    def node_test(self):
+        return self._node_test
+
+    @property
+    def indexed(self):
+        return isinstance(self.axis, (Descendant, DescendantOrSelf)) and \
+            self.node_test not in ['node', 'element'] and \
+            not self.match_subclasses
+
+    def traverse(self, node, order, backwards=False, stats=None):
+        if self.indexed:
+            index = DocumentIndex.get(node)
+            if index is not None and isinstance(order, DocumentOrder):
+                name = 'Text' if self.node_test == 'text' else self.node_test
+                include_self = isinstance(self.axis, DescendantOrSelf)
+                result = index.descendants(order, node, name, include_self)
+                if stats is not None:
+                    result = stats.count_matched(stats.count_visited(result))
+                return result
+
+        if isinstance(self.axis, Attribute):
+            nodes = self.axis.traverse_name(node, self.node_test)
+            if stats is not None:
+                nodes = stats.count_matched(stats.count_visited(nodes))
+            return ((n, order.key(node)) for n in nodes)
+
+        if isinstance(self.axis, Id):
+            nodes = self.axis.traverse_name(node, self.node_test)
+            if stats is not None:
+                nodes = stats.count_matched(stats.count_visited(nodes))
+            return ((n, order.key(n)) for n in nodes)
+
+        if backwards:
+            nodes = self.axis.traverse_backwards(node)
+        else:
+            nodes = self.axis.traverse(node)
+        if stats is not None:
+            nodes = stats.count_visited(nodes)
+
+        key = order.key
+        result = ((n, key(n)) for n in self.filter_nodes(nodes))
+        if stats is not None:
+            result = stats.count_matched(result)
+        return result
+
+    def lookup(self, node, order, attribute, value, stats=None):
+        # Finds the node with an id, or name, from the ids and names of the
+        # document instead of searching the descendants of the context node.
+        # The node still has to match the rest of the step and predicates.
+        # Ids and names that are not registered with the document, or that
+        # were registered for a node that no longer has them, are searched
+        # for instead.
+        document = DocumentOrder.root(node)
+        ids = getattr(document, 'ids', None)
+        nameids = getattr(document, 'nameids', None)
+        if not isinstance(ids, dict) or not isinstance(nameids, dict):
+            return None
+
+        found = ids.get(nameids.get(value) if attribute == 'names' else value)
+        if found is None or value not in found.get(attribute, ()):
+            return None
+
+        ancestor = found
+        if not isinstance(self.axis, DescendantOrSelf):
+            ancestor = ancestor.parent
+        while ancestor is not None and ancestor is not node:
+            ancestor = ancestor.parent
+        nodes = () if ancestor is None else (found,)
+
+        if stats is not None:
+            nodes = stats.count_visited(nodes)
+        result = ((n, order.key(n)) for n in self.filter_nodes(nodes))
+        if stats is not None:
+            result = stats.count_matched(result)
+        return result
+
+    def filter_nodes(self, nodes):
+        return filter(self.get_node_test(), nodes)
+
+    def perform_node_test(self, node):
+        return self.get_node_test()(node)
+
+    def get_node_test(self):
+        if self._compiled is None or \
+                self._compiled[0] != self.match_subclasses:
+            self._compiled = (
+                self.match_subclasses, self._compile_node_test())
+        return self._compiled[1]
+
+    def _compile_node_test(self):
+        # The result of the node test is cached for each class of node, so
+        # each node only needs a dictionary lookup.  Attribute nodes are
+        # tested by their name instead.
+        node_test = self.node_test
+        match_subclasses = self.match_subclasses
+        results = {Attribute.Node: None}
+
+        def test_class(cls):
+            if match_subclasses:
+                names = set(c.__name__ for c in cls.__mro__)
+            else:
+                names = set([cls.__name__])
+
+            if node_test == 'node':
+                return True
+            if node_test == 'element':
+                return not names & set(['Text', 'comment'])
+            if node_test == 'text':
+                return 'Text' in names
+            return node_test in names
+
+        def perform_node_test(node):
+            cls = node.__class__
+            try:
+                result = results[cls]
+            except KeyError:
+                result = results[cls] = test_class(cls)
+            if result is None:
+                return node_test == node.name
+            return result
+
+        return perform_node_test
@@ -0,0 +1,142 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from collections import OrderedDict
+from operator import itemgetter
+
+from .axis import Attribute, Descendant, DescendantOrSelf
+from .docpath import Docpath, DocpathStep
+from .index import DocumentIndex, DocumentOrder
+from .predicate import Predicate, TextCache
+
+
+class DocpathSet(object):
+
+    def __init__(self, docpaths):
+        self.docpaths = list(docpaths)
+        self._root = None
+
+    def __len__(self):
+        return len(self.docpaths)
+
+    def findall(self, from_node):
+        texts = TextCache()
+        order = texts.order = DocumentOrder.get(from_node)
+        results = [[] for _ in self.docpaths]
+        self._evaluate(
+            self._get_root(), [(from_node, order.key(from_node))], order,
+            texts, results)
+        return results
+
+    def _get_root(self):
+        if self._root is None:
+            root = DocpathSetNode(None, None, [])
+            for rule, docpath in enumerate(self.docpaths):
+                branch = root
+                for step, predicates in self._steps(docpath.plan):
+                    branch = branch.add(docpath, step, predicates)
+                branch.rules.append(rule)
+            self._root = root
+        return self._root
+
+    @staticmethod
+    def _steps(steps):
+        if not isinstance(steps, list):
+            return [(steps, [])]
+
+        steps_with_predicates = []
+        for step in steps:
+            if isinstance(step, Predicate):
+                steps_with_predicates[-1][1].append(step)
+            else:
+                steps_with_predicates.append((step, []))
+        return steps_with_predicates
+
+    def _evaluate(self, branch, node_addresses, order, texts, results):
+        for rule in branch.rules:
+            results[rule].extend(map(itemgetter(0), node_addresses))
+        if not node_addresses:
+            return
+
+        walk, other = [], []
+        for child in branch.children.values():
+            (walk if child.walkable else other).append(child)
+        if len(walk) < 2 or DocumentIndex.get(node_addresses[0][0]) or any(
+                isinstance(n, Attribute.Node) for n, _ in node_addresses):
+            walk, other = [], walk + other
+
+        for child, child_node_addresses in self._walk(
+                walk, node_addresses, order, texts):
+            self._evaluate(
+                child, child_node_addresses, order, texts, results)
+
+        for child in other:
+            child_node_addresses = list(child.docpath._traverse(
+                child.step, child.predicates, iter(node_addresses), order,
+                None, texts))
+            self._evaluate(
+                child, child_node_addresses, order, texts, results)
+
+    @staticmethod
+    def _walk(branches, node_addresses, order, texts=None):
+        # Visits the descendants of the context nodes once, and gives each
+        # node to every descendant step that it matches.  The outermost
+        # context nodes do not overlap, so the matches stay in document order.
+        if not branches:
+            return []
+
+        named, tests = {}, []
+        for branch in branches:
+            test = (branch, branch.step.get_node_test())
+            if branch.step.node_test in ('node', 'element', 'text') or \
+                    branch.step.match_subclasses:
+                tests.append(test)
+            else:
+                named.setdefault(branch.step.node_test, []).append(test)
+
+        matches = OrderedDict((branch, []) for branch in branches)
+        for context, _ in Docpath._outermost(iter(node_addresses), order):
+            for node in DescendantOrSelf.traverse(context):
+                candidates = named.get(node.__class__.__name__, [])
+                for branch, node_test in candidates + tests:
+                    if (node is not context or branch.include_self) and \
+                            node_test(node):
+                        matches[branch].append(node)
+
+        key = order.key
+        return [
+            (branch, list(Predicate.filter_nodes(
+                branch.predicates, ((n, key(n)) for n in nodes), texts)))
+            for branch, nodes in matches.items()]
+
+
+class DocpathSetNode(object):
+
+    def __init__(self, docpath, step, predicates):
+        self.docpath = docpath
+        self.step = step
+        self.predicates = predicates
+        self.children = OrderedDict()
+        self.rules = []
+
+    def add(self, docpath, step, predicates):
+        key = (str(Docpath(step)), tuple(str(p) for p in predicates))
+        child = self.children.get(key)
+        if child is None:
+            child = self.children[key] = DocpathSetNode(
+                docpath, step, predicates)
+        return child
+
+    @property
+    def walkable(self):
+        # Steps that can look up their nodes by id or name are cheaper to
+        # evaluate on their own.
+        return isinstance(self.step, DocpathStep) and \
+            isinstance(self.step.axis, (Descendant, DescendantOrSelf)) and \
+            not any(p.positional for p in self.predicates) and not (
+                self.docpath.use_document_ids and self.predicates and
+                self.predicates[0].compiled.lookup)
+
+    @property
+    def include_self(self):
+        return isinstance(self.step.axis, DescendantOrSelf)
@@ -0,0 +1,210 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from collections import Counter
+
+from .axis import (
+    Ancestor, AncestorOrSelf, Attribute, Child, Descendant, DescendantOrSelf,
+    Following, FollowingSibling, Id, Preceding, PrecedingSibling, Root, Self)
+from .docpath import Docpath, DocpathStep
+from .index import DocumentIndex
+from .predicate import Predicate
+
+
+class DocpathExplainer(object):
+
+    @classmethod
+    def explain(cls, docpath, document=None):
+        statistics = index = None
+        if document is not None:
+            statistics = DocumentStatistics(document)
+            index = DocumentIndex.get(document)
+
+        rows = []
+        cls._explain(
+            docpath.plan, 0, rows, statistics, index, 1, 'document')
+        return cls._table(rows, statistics is not None)
+
+    @classmethod
+    def _explain(cls, steps, depth, rows, statistics, index, estimate, name):
+        if isinstance(steps, DocpathStep):
+            return cls._explain_step(
+                steps, depth, rows, statistics, index, estimate, name)
+        if isinstance(steps, tuple):
+            return cls._explain_tuple(
+                steps, depth, rows, statistics, index, estimate, name)
+        if isinstance(steps, list):
+            return cls._explain_list(
+                steps, depth, rows, statistics, index, estimate, name)
+        raise ValueError("invalid path step: {}".format(steps))
+
+    @classmethod
+    def _explain_step(cls, step, depth, rows, statistics, index, estimate,
+                      name):
+        notes = []
+        if step.axis._reverse:
+            notes.append('reverse')
+        if step.indexed:
+            notes.append(
+                'index' if statistics is None or index is not None
+                else 'no index')
+
+        if statistics is not None:
+            estimate = statistics.estimate(step, estimate, name)
+        rows.append((depth, str(step), notes, estimate))
+
+        if step.node_test in ['node', 'element'] or \
+                isinstance(step.axis, Id):
+            return estimate, None
+        return estimate, 'Text' if step.node_test == 'text' else \
+            step.node_test
+
+    @classmethod
+    def _explain_tuple(cls, steps, depth, rows, statistics, index, estimate,
+                       name):
+        estimates, names = [], set()
+        for step in steps:
+            step_estimate, step_name = cls._explain(
+                step, depth + 1, rows, statistics, index, estimate, name)
+            estimates.append(step_estimate)
+            names.add(step_name)
+
+        if statistics is not None:
+            estimate = sum(estimates)
+        return estimate, names.pop() if len(names) == 1 else None
+
+    @classmethod
+    def _explain_list(cls, steps, depth, rows, statistics, index, estimate,
+                      name):
+        contexts = estimate
+        lookup = False
+        for step in steps:
+            if isinstance(step, Predicate):
+                rows.append((
+                    depth + 1, '[{}]'.format(step), cls._notes(step, lookup),
+                    estimate))
+                limit = step.compiled.limit
+                if statistics is not None and limit is not None:
+                    estimate = min(estimate, contexts * max(limit, 0))
+                    rows[-1] = rows[-1][:3] + (estimate,)
+                if statistics is not None and lookup and \
+                        step.compiled.lookup is not None:
+                    estimate = min(estimate, contexts)
+                    rows[-1] = rows[-1][:3] + (estimate,)
+                lookup = False
+            else:
+                contexts = estimate
+                lookup = isinstance(step, DocpathStep) and \
+                    isinstance(step.axis, (Descendant, DescendantOrSelf)) \
+                    and Docpath.use_document_ids
+                estimate, name = cls._explain(
+                    step, depth, rows, statistics, index, estimate, name)
+        return estimate, name
+
+    @staticmethod
+    def _notes(predicate, lookup=False):
+        compiled = predicate.compiled
+        notes = []
+        if compiled.positional:
+            notes.append('position')
+        if compiled.size:
+            notes.append('size')
+        if compiled.limit is not None:
+            notes.append('first {}'.format(compiled.limit))
+        if lookup and compiled.lookup is not None:
+            notes.append('{} lookup'.format(compiled.lookup[0]))
+        return notes
+
+    @staticmethod
+    def _table(rows, estimates):
+        header = ('', 'notes')
+        if estimates:
+            header += ('estimate',)
+
+        lines = [header]
+        for depth, name, notes, estimate in rows:
+            line = ('  ' * depth + name, ', '.join(notes))
+            if estimates:
+                line += ('~{}'.format(estimate),)
+            lines.append(line)
+
+        width = max(len(line[0]) for line in lines)
+        notes_width = max(len(line[1]) for line in lines)
+        return '\n'.join(
+            ('{:<{}}  {:<{}}'.format(line[0], width, line[1], notes_width) +
+             ''.join('{:>10}'.format(column) for column in line[2:])).rstrip()
+            for line in lines)
+
+
+class DocumentStatistics(object):
+
+    def __init__(self, document):
+        self.names = Counter()
+        self.children = Counter()
+        self.attributes = Counter()
+        self.nodes = self.parents = self.depths = 0
+
+        stack = [(document, 0)]
+        while stack:
+            node, depth = stack.pop()
+            name = node.__class__.__name__
+            self.names[name] += 1
+            self.nodes += 1
+            self.depths += depth
+            self.attributes.update(getattr(node, 'attributes', {}).keys())
+            if node.children:
+                self.parents += 1
+                for child in node.children:
+                    self.children[name, child.__class__.__name__] += 1
+                    stack.append((child, depth + 1))
+
+    @staticmethod
+    def matches(name, node_test):
+        if node_test == 'node':
+            return True
+        if node_test == 'element':
+            return name not in ['Text', 'comment']
+        if node_test == 'text':
+            return name == 'Text'
+        return name == node_test
+
+    def count(self, node_test):
+        return sum(
+            count for name, count in self.names.items()
+            if self.matches(name, node_test))
+
+    def estimate(self, step, contexts, name):
+        axis, node_test = step.axis, step.node_test
+        if isinstance(axis, Root):
+            return 1 if self.matches('document', node_test) else 0
+        if isinstance(axis, Id):
+            return 1
+
+        if isinstance(axis, Attribute):
+            elements = max(self.count('element'), 1)
+            total = self.attributes[node_test]
+            estimate = contexts * total / elements
+        else:
+            total = self.count(node_test)
+            estimate = contexts * total / self.nodes
+
+        if isinstance(axis, Self) and name is not None:
+            estimate = contexts if self.matches(name, node_test) else 0
+        elif isinstance(axis, Child) and name is not None and \
+                self.names[name]:
+            children = sum(
+                count for (parent, child), count in self.children.items()
+                if parent == name and self.matches(child, node_test))
+            estimate = contexts * children / self.names[name]
+        elif isinstance(axis, (Child, FollowingSibling, PrecedingSibling)):
+            fanout = (self.nodes - 1) / max(self.parents, 1)
+            if not isinstance(axis, Child):
+                fanout /= 2
+            estimate *= fanout
+        elif isinstance(axis, (Ancestor, AncestorOrSelf)):
+            estimate *= self.depths / self.nodes + 1
+        elif isinstance(
+                axis, (Descendant, DescendantOrSelf, Following, Preceding)):
+            estimate = total
+
+        return int(round(min(estimate, total)))
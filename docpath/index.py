@@ -0,0 +1,331 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from bisect import bisect_left, bisect_right, insort
+from itertools import count
+from math import inf
+from weakref import WeakKeyDictionary, ref
+
+from .axis import Attribute, Axis, DescendantOrSelf
+
+
+class DocumentOrder(object):
+
+    gap = 1 << 16
+
+    _orders = WeakKeyDictionary()
+
+    def __init__(self, root):
+        self._root = ref(root)
+        self.generation = 0
+        self._build()
+
+    def __len__(self):
+        return len(self._nodes)
+
+    @classmethod
+    def build(cls, node):
+        root = cls.root(node)
+        order = cls._orders[root] = cls(root)
+        return order
+
+    @classmethod
+    def get(cls, node):
+        # Only documents that report their changes keep their numbering,
+        # other documents are ordered by the positions of their nodes as the
+        # nodes are met, so moved nodes are always in their new place.
+        root = cls.root(node)
+        order = cls._orders.get(root)
+        if order is None:
+            order = DocumentPositions(root)
+        return order
+
+    @classmethod
+    def invalidate(cls, node):
+        cls._orders.pop(cls.root(node), None)
+
+    @staticmethod
+    def root(node):
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    @classmethod
+    def notify_inserted(cls, node):
+        Axis.invalidate_positions(node.parent)
+        order = cls._orders.get(cls.root(node))
+        if order is not None:
+            order._insert(node)
+
+    @classmethod
+    def notify_removed(cls, parent, node):
+        Axis.invalidate_positions(parent)
+        order = cls._orders.get(cls.root(parent))
+        if order is not None:
+            order._remove(parent, node)
+
+    @classmethod
+    def notify_replaced(cls, old, new):
+        cls.notify_removed(new.parent, old)
+        cls.notify_inserted(new)
+
+    def _insert(self, node):
+        parent = node.parent
+        position = Axis.node_position(node)
+        if position == 0:
+            previous = self._known(parent)
+        else:
+            sibling = self._known(parent.children[position - 1])
+            previous = None if sibling is None else self._ends[sibling]
+        following = self._following(node)
+        size = sum(1 for _ in DescendantOrSelf.traverse(node))
+
+        if previous is None or following is False or \
+                self._known(node) is not None:
+            self._build()
+            return
+        if following is None:
+            step = self.gap
+        else:
+            step = (following - previous) // (size + 1)
+            if step < 1:
+                self._build()
+                return
+
+        added = []
+        self._number(
+            node, count(previous + step, step), added)
+
+        end = added[-1][0]
+        while parent is not None:
+            number = self._numbers[id(parent)]
+            if self._ends[number] >= end:
+                break
+            self._ends[number] = end
+            parent = parent.parent
+
+        index = self._index()
+        if index is not None:
+            index._insert(added)
+
+    def _following(self, node):
+        while node.parent is not None:
+            position = Axis.node_position(node)
+            if position + 1 < len(node.parent.children):
+                number = self._known(node.parent.children[position + 1])
+                return False if number is None else number
+            node = node.parent
+        return None
+
+    def _remove(self, parent, node):
+        number = self._known(node)
+        if number is None or self._known(parent) is None:
+            return
+
+        end = self._ends[number]
+        removed = []
+        for descendant in DescendantOrSelf.traverse(node):
+            descendant_number = self._numbers.pop(id(descendant), None)
+            if descendant_number is not None:
+                del self._nodes[descendant_number]
+                del self._ends[descendant_number]
+                removed.append((descendant_number, descendant))
+
+        last = parent
+        while last.children:
+            last = last.children[-1]
+        last = self._known(last)
+        if last is None:
+            self._build()
+            return
+
+        while parent is not None:
+            number = self._numbers[id(parent)]
+            if self._ends[number] != end:
+                break
+            self._ends[number] = last
+            parent = parent.parent
+
+        index = self._index()
+        if index is not None:
+            index._remove(removed)
+
+    def _index(self):
+        index = DocumentIndex._indexes.get(self._root())
+        if index is not None and index._order is self and \
+                index._generation == self.generation:
+            return index
+        return None
+
+    def _build(self):
+        self._numbers = {}
+        self._nodes = {}
+        self._ends = {}
+        self._number(self._root(), count(0, self.gap))
+        self.generation += 1
+
+    def _number(self, root, numbers, added=None):
+        stack = [(root, 0)]
+        parents = []
+        previous = None
+        while stack:
+            node, depth = stack.pop()
+            number = next(numbers)
+
+            while parents and parents[-1][1] >= depth:
+                self._ends[parents.pop()[0]] = previous
+
+            self._numbers[id(node)] = number
+            self._nodes[number] = ref(node)
+            self._ends[number] = number
+            if added is not None:
+                added.append((number, node))
+
+            children = node.children
+            if children:
+                parents.append((number, depth))
+                for i in range(len(children) - 1, -1, -1):
+                    stack.append((children[i], depth + 1))
+            previous = number
+
+        for number, _ in parents:
+            self._ends[number] = previous
+
+    def rebuild(self):
+        self._build()
+
+    def node(self, number):
+        return self._nodes[number]()
+
+    def number(self, node):
+        number = self._numbers.get(id(node))
+        if number is None or self._nodes[number]() is not node:
+            self._build()
+            number = self._numbers.get(id(node))
+            if number is None:
+                raise ValueError("node is not in the document: {!r}".format(
+                    node))
+        return number
+
+    def _known(self, node):
+        number = self._numbers.get(id(node))
+        if number is not None and self._nodes[number]() is node:
+            return number
+        return None
+
+    def key(self, node):
+        if isinstance(node, Attribute.Node):
+            node = node.parent
+        return self.number(node)
+
+    def end(self, number):
+        return self._ends[number]
+
+
+class DocumentPositions(object):
+
+    def __init__(self, root):
+        self._roots = []
+        self._keys = {}
+        self._add_root(root)
+
+    def _add_root(self, root):
+        # Nodes from other trees, such as the document of a detached copy of
+        # a node, are ordered after the trees that were met before them.  The
+        # roots are kept so their ids are not reused during the query.
+        key = (len(self._roots),)
+        self._roots.append(root)
+        self._keys[id(root)] = key
+        return key
+
+    def key(self, node):
+        if isinstance(node, Attribute.Node):
+            node = node.parent
+        key = self._keys.get(id(node))
+        if key is not None:
+            return key
+
+        ancestors = []
+        while key is None:
+            parent = node.parent
+            if parent is None:
+                key = self._add_root(node)
+                break
+            ancestors.append(node)
+            node = parent
+            key = self._keys.get(id(node))
+        for node in reversed(ancestors):
+            key += (Axis.node_position(node),)
+            self._keys[id(node)] = key
+        return key
+
+    @staticmethod
+    def end(key):
+        return key + (inf,)
+
+
+class DocumentIndex(object):
+
+    _indexes = WeakKeyDictionary()
+
+    def __init__(self, document):
+        self._build(DocumentOrder.build(document))
+
+    def __len__(self):
+        return len(self._order)
+
+    @classmethod
+    def build(cls, document):
+        index = cls(document)
+        cls._indexes[document] = index
+        return index
+
+    @classmethod
+    def get(cls, node):
+        document = getattr(node, 'document', None)
+        if document is None:
+            return None
+        return cls._indexes.get(document)
+
+    @classmethod
+    def remove(cls, document):
+        cls._indexes.pop(document, None)
+        DocumentOrder.invalidate(document)
+
+    def _build(self, order):
+        self._names = {}
+        for number, node in sorted(order._nodes.items()):
+            self._names.setdefault(node().__class__.__name__, []).append(
+                number)
+        self._order = order
+        self._generation = order.generation
+
+    def _insert(self, added):
+        for number, node in added:
+            insort(self._names.setdefault(node.__class__.__name__, []), number)
+
+    def _remove(self, removed):
+        for number, node in removed:
+            numbers = self._names[node.__class__.__name__]
+            del numbers[bisect_left(numbers, number)]
+
+    def _check(self, order):
+        if self._order is not order or self._generation != order.generation:
+            self._build(order)
+
+    def descendants(self, order, node, name, include_self=False):
+        number = order.number(node)
+        self._check(order)
+
+        numbers = self._names.get(name, [])
+        if include_self:
+            start = bisect_left(numbers, number)
+        else:
+            start = bisect_right(numbers, number)
+        end = bisect_right(numbers, order.end(number), start)
+
+        return ((order.node(n), n) for n in numbers[start:end])
+
+    def count(self, name):
+        self._check(self._order)
+        return len(self._names.get(name, ()))
@@ -0,0 +1,98 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from .axis import (
+    AncestorOrSelf, Attribute, Axis, Child, Descendant, DescendantOrSelf,
+    Self)
+from .docpath import DocpathStep
+from .predicate import Predicate
+
+
+class DocpathOptimizer(object):
+
+    @classmethod
+    def optimize(cls, steps):
+        if isinstance(steps, tuple):
+            return cls._optimize_tuple(steps)
+        if isinstance(steps, list):
+            return cls._optimize_list(steps)
+        return steps
+
+    @classmethod
+    def _optimize_tuple(cls, steps):
+        result = []
+        for step in steps:
+            step = cls.optimize(step)
+            if isinstance(step, tuple):
+                result.extend(step)
+            else:
+                result.append(step)
+        return tuple(result)
+
+    @classmethod
+    def _optimize_list(cls, steps):
+        steps = list(cls._flatten(steps))
+        result = []
+        for i, (step, predicates) in enumerate(steps):
+            # The node test of self::node does not match attribute nodes, so
+            # the step is only removed when there cannot be an attribute
+            # context node, or the next step finds nothing from one.
+            if not predicates and cls._is_step(step, Self, 'node') and (
+                    result and not cls._attributes(result[-1][0]) or
+                    i + 1 < len(steps) and isinstance(
+                        steps[i + 1][0], DocpathStep) and isinstance(
+                        steps[i + 1][0].axis, (Attribute, Child, Descendant))):
+                continue
+
+            if result and isinstance(step, DocpathStep) and \
+                    isinstance(step.axis, Child) and \
+                    not result[-1][1] and \
+                    cls._is_step(result[-1][0], DescendantOrSelf, 'node') and \
+                    not any(p.positional for p in predicates):
+                step = DocpathStep(Axis('descendant'), step.node_test)
+                result.pop()
+
+            result.append((step, predicates))
+
+        if not result:
+            result.append((DocpathStep(Axis('self'), 'node'), []))
+
+        optimized = []
+        for step, predicates in result:
+            optimized.append(step)
+            optimized.extend(predicates)
+        return optimized
+
+    @classmethod
+    def _flatten(cls, steps):
+        steps_with_predicates = []
+        for step in steps:
+            if isinstance(step, Predicate):
+                steps_with_predicates[-1][1].append(step)
+            else:
+                steps_with_predicates.append((cls.optimize(step), []))
+
+        for step, predicates in steps_with_predicates:
+            if isinstance(step, list) and not predicates:
+                yield from cls._flatten(step)
+            else:
+                yield step, predicates
+
+    @classmethod
+    def _attributes(cls, step):
+        # Whether the step can find attribute nodes.  The axes that include
+        # the context node keep an attribute context node.
+        if isinstance(step, DocpathStep):
+            return isinstance(step.axis, (
+                AncestorOrSelf, Attribute, DescendantOrSelf, Self))
+        if isinstance(step, tuple):
+            return any(cls._attributes(s) for s in step)
+        if isinstance(step, list):
+            steps = [s for s in step if not isinstance(s, Predicate)]
+            return not steps or cls._attributes(steps[-1])
+        return True
+
+    @staticmethod
+    def _is_step(step, axis, node_test):
+        return isinstance(step, DocpathStep) and \
+            isinstance(step.axis, axis) and step.node_test == node_test
@@ -1,139 +1,227 @@
 # This file is part of the docpath package.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
-import ast
-import operator
-
 from collections import namedtuple
-from re import compile
-from simpleeval import simple_eval
+from re import compile, escape
 
 from .axis import Axis
-from .docpath import Docpath
+from .cache import PathCache
+from .docpath import Docpath, DocpathStep
+from .predicate import Predicate
 
 
 def path(docpath):
-    return DocpathParser.parse(docpath)
+    return path_cache.get(docpath)
 
 
 class DocpathParser(object):
 
-    Token = namedtuple('Token', 'name value')
+    Token = namedtuple('Token', 'name value position')
 
-    _name_re = r'([a-zA-Z_][a-zA-Z0-9_.-]*)'
+    _name_re = r'[a-zA-Z_][a-zA-Z0-9_.-]*'
 
     literals = [
-        '@', '::', '..', '.', '//', '/', '|', '*', '(', ')', '[']
+        '@', '::', '..', '.', '//', '/', '|', '*', '(', ')', '[', ']']
 
-    tokens = [
-        ('space', r'(\s+)'),
+    name_re = compile(_name_re + '$')
 
-        ('axis', r'({})(?=\s*::)'.format(_name_re)),
-        ('function', r'({})(?=\s*\()'.format(_name_re)),
-        ('name', _name_re),
-    ] + [(l, '({})'.format(''.join(['\\' + c for c in l]))) for l in literals]
+    token_re = compile(
+        r'(?P<space>\s+)|'
+        r'(?P<axis>{name})(?=\s*::)|'
+        r'(?P<function>{name})(?=\s*\()|'
+        r'(?P<name>{name})|'
+        r'(?P<string>"[^"]*"|\'[^\']*\')|'
+        r'(?P<literal>{literals})'.format(
+            name=_name_re,
+            literals='|'.join(escape(literal) for literal in literals)))
 
-    predicate_tokens = [
-        ('[', r'(\[)'),
-        (']', r'(\])'),
-        ('literal', r'(("[^"]*")|(\'[^\']*\'))'),
-        ('predicate_contents', r'([^\[\]\"\']+)'),
-    ]
+    predicate_re = compile(r'[^\[\]"\']+|"[^"]*"|\'[^\']*\'|\[|\]')
 
     @classmethod
-    def lexer(cls, docpath, start_pos=0, tokens=None):
-        if tokens is None:
-            tokens = cls.tokens
-        if isinstance(tokens[0][1], str):
-            tokens = [(k, compile(v)) for k, v in tokens]
-
-        pos = start_pos
-        while pos < len(docpath):
-            match = None
-            for token, pattern in tokens:
-                match = pattern.match(docpath, pos)
-                if match:
-                    pos = match.end()
-                    match = cls.Token(token, match.group(0))
-                    break
-
-            if not match:
-                raise ValueError(
-                    "syntax error in docpath '{}' at position {}".format(
-                        docpath, pos))
-
-            if match.name == '[':
-                match = cls._lexer_predicate(docpath, pos)
-                pos += len(match.value) - 1
-
-            yield match
+    def lexer(cls, docpath):
+        position = 0
+        match = cls.token_re.match
+        while position < len(docpath):
+            token = match(docpath, position)
+            if token is None:
+                cls._error(docpath, position)
+
+            name = token.lastgroup
+            value = token.group()
+            if name == 'space':
+                position += len(value)
+                continue
+            if name == 'literal':
+                name = value
+                if value == '[':
+                    value = cls._lexer_predicate(docpath, position)
+                    name = 'predicate'
+
+            yield cls.Token(name, value, position)
+            position += len(value)
 
     @classmethod
-    def _lexer_predicate(cls, docpath, start_pos=0):
-        pos = start_pos
-        predicate = ['[']
-        for match in cls.lexer(docpath, pos, cls.predicate_tokens):
-            predicate.append(match.value)
-            pos += len(match.value)
-            if match.name == ']':
-                break
-
-        if match.name != ']':
-            raise ValueError(
-                "unterminated predicate in docpath '{}' at position {}".format(
-                    docpath, start_pos))
-
-        return cls.Token('predicate', ''.join(predicate))
+    def _lexer_predicate(cls, docpath, start_position):
+        position = start_position + 1
+        depth = 1
+        match = cls.predicate_re.match
+        while depth:
+            part = match(docpath, position)
+            if part is None:
+                raise ValueError(
+                    "unterminated predicate in docpath '{}' at position "
+                    "{}".format(docpath, start_position))
+            part = part.group()
+            if part == '[':
+                depth += 1
+            elif part == ']':
+                depth -= 1
+            position += len(part)
+        return docpath[start_position:position]
+
+    @staticmethod
+    def _error(docpath, position):
+        raise ValueError("syntax error in docpath '{}' at position {}".format(
+            docpath, position))
 
     @classmethod
-    def parse(cls, docpath):
+    def normalize(cls, docpath):
         replacements = {
-            '::': '.',
-            '..': 'parent.node',
-            '.': 'self.node',
-            '@': 'attribute.',
+            '//': '/descendant_or_self::node/',
+            '..': 'parent::node',
+            '.': 'self::node',
+            '@': 'attribute::',
             '*': 'element',
         }
 
-        expression = []
+        normalized = []
         last_token_name = None
         for token in cls.lexer(docpath):
             part = replacements.get(token.name, token.value)
-            if token.name == 'predicate':
-                part = '["{}"]'.format(part[1:-1].replace('"', r'\"'))
+            if token.name == 'name' and last_token_name not in ['::', '@']:
+                part = 'child::' + part
+            elif token.name == '*' and last_token_name not in ['::', '@']:
+                part = 'child::' + part
 
-            if part.startswith('/') and last_token_name in [None, '|', '(']:
-                part = 'root.node' + part
-
-            expression.append(part)
+            normalized.append(part)
             last_token_name = token.name
 
-        expression = ''.join(expression)
-        return cls.evaluate(expression)
-
-    @classmethod
-    def evaluate(cls, path):
-        result = simple_eval(path, **cls._get_evaluate_context())
-
-        if not isinstance(result, Docpath):
-            raise ValueError("invalid path: {}".format(path))
-
-        return result
+        return ''.join(normalized)
 
     @classmethod
-    def _get_evaluate_context(cls):
-        def name_handler(name):
-            try:
-                return Axis(name.id)
-            except ValueError:
-                return getattr(Axis('child'), name.id)
-
-        return {
-            'functions': {},
-            'names': name_handler,
-            'operators': {
-                ast.BitOr: operator.or_,
-                ast.Div: operator.truediv,
-                ast.FloorDiv: operator.floordiv,
-            },
-        }
+    def parse(cls, docpath):
+        tokens = list(cls.lexer(docpath))
+        tokens.append(cls.Token(None, '', len(docpath)))
+        parser = DocpathParserState(docpath, tokens)
+        steps = parser.parse_union()
+        parser.expect(None)
+        return Docpath(steps)
+
+
+class DocpathParserState(object):
+
+    # The steps are built the same way as the operators of Docpath build
+    # them, without creating an intermediate Docpath for every step.
+    axes = frozenset(Axis.axes())
+
+    def __init__(self, docpath, tokens):
+        self.docpath = docpath
+        self.tokens = tokens
+        self.index = 0
+
+    @property
+    def token(self):
+        return self.tokens[self.index]
+
+    def next(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def expect(self, name):
+        if self.token.name != name:
+            DocpathParser._error(self.docpath, self.token.position)
+        return self.next()
+
+    def parse_union(self):
+        paths = []
+        while True:
+            steps = self.parse_path()
+            if isinstance(steps, tuple):
+                paths.extend(steps)
+            else:
+                paths.append(steps)
+            if self.token.name != '|':
+                break
+            self.next()
+        return paths[0] if len(paths) == 1 else tuple(paths)
+
+    def parse_path(self):
+        steps = []
+        if self.token.name in ['/', '//']:
+            steps.append(DocpathStep(Axis('root'), 'node'))
+        else:
+            self.parse_step(steps)
+
+        while self.token.name in ['/', '//']:
+            if self.next().name == '//':
+                steps.append(DocpathStep(Axis('descendant_or_self'), 'node'))
+            self.parse_step(steps)
+        return steps[0] if len(steps) == 1 else steps
+
+    def parse_step(self, steps):
+        token = self.next()
+        if token.name == '(':
+            group = self.parse_union()
+            self.expect(')')
+            if isinstance(group, list):
+                steps.extend(group)
+            else:
+                steps.append(group)
+        elif token.name == '.':
+            steps.append(DocpathStep(Axis('self'), 'node'))
+        elif token.name == '..':
+            steps.append(DocpathStep(Axis('parent'), 'node'))
+        elif token.name == '@':
+            steps.append(DocpathStep(
+                Axis('attribute'), self.parse_node_test(True)))
+        elif token.name == 'axis':
+            if token.value not in self.axes:
+                raise ValueError(
+                    "unknown axis '{}' in docpath '{}' at position {}".format(
+                        token.value, self.docpath, token.position))
+            self.expect('::')
+            steps.append(DocpathStep(
+                Axis(token.value), self.parse_node_test(True)))
+        elif token.name == 'function' and token.value == 'id':
+            steps.append(self.parse_id())
+        else:
+            self.index -= 1
+            steps.append(DocpathStep(Axis('child'), self.parse_node_test()))
+
+        while self.token.name == 'predicate':
+            steps.append(Predicate(self.next().value[1:-1]))
+
+    def parse_node_test(self, after_axis=False):
+        token = self.next()
+        if token.name == '*':
+            return 'element'
+        if token.name == 'name' and (
+                after_axis or token.value not in self.axes):
+            return token.value
+        DocpathParser._error(self.docpath, token.position)
+
+    def parse_id(self):
+        # Each of the space separated ids is a step on the id axis.
+        self.expect('(')
+        token = self.expect('string')
+        self.expect(')')
+
+        ids = token.value[1:-1].split()
+        if not ids or not all(DocpathParser.name_re.match(i) for i in ids):
+            DocpathParser._error(self.docpath, token.position)
+        steps = tuple(DocpathStep(Axis('id'), i) for i in ids)
+        return steps[0] if len(steps) == 1 else steps
+
+
+path_cache = PathCache(DocpathParser)
@@ -4,15 +4,28 @@
 import ast
 import operator
 
-from simpleeval import safe_add, safe_mult, simple_eval
+from collections import OrderedDict, namedtuple
+from itertools import islice
+from simpleeval import (
+    MAX_STRING_LENGTH, FeatureNotAvailable, FunctionNotDefined,
+    IterableTooLong, OperatorNotDefined, safe_add, safe_mult)
 
 from .axis import Axis
 
 
+Context = namedtuple('Context', 'node address position size texts')
+
+CompiledPredicate = namedtuple(
+    'CompiledPredicate', 'evaluator positional size limit lookup')
+
+
 class Predicate(object):
+    __slots__ = ('_raw_predicate', '_predicate', '_compiled')
 
     def __init__(self, predicate):
         self._raw_predicate = predicate
+        self._predicate = None
+        self._compiled = None
 
     def __repr__(self):
         return 'Predicate(\'{}\')'.format(self)
@@ -20,9 +33,12 @@ class Predicate(object):
     def __str__(self):
         return self.predicate
 
+    def __reduce__(self):
+        return Predicate, (self._raw_predicate,)
+
     @property
     def predicate(self):
-        if not getattr(self, '_predicate', None):
+        if self._predicate is None:
             predicate = self._raw_predicate
             replacements = {
                 '::': '.',
@@ -38,103 +54,578 @@ class Predicate(object):
 
         return self._predicate
 
+    @property
+    def compiled(self):
+        if self._compiled is None:
+            self._compiled = PredicateCompiler.compile(self.predicate)
+        return self._compiled
+
+    @property
+    def evaluator(self):
+        return self.compiled.evaluator
+
+    @property
+    def positional(self):
+        return self.compiled.positional
+
     @classmethod
-    def filter_nodes(cls, predicates, node_addresses):
+    def filter_nodes(cls, predicates, node_addresses, texts=None):
         if predicates:
             for predicate in predicates:
-                node_addresses = predicate._filter_nodes(node_addresses)
+                node_addresses = predicate._filter_nodes(
+                    node_addresses, texts)
         return node_addresses
 
-    def _filter_nodes(self, node_addresses):
-        node_addresses = list(node_addresses)
-        result = []
+    def _filter_nodes(self, node_addresses, texts=None):
+        evaluator, _, size, limit, _ = self.compiled
+        if limit is not None and limit < 1:
+            return
+        if isinstance(evaluator, Constant) and limit is not None:
+            yield from islice(node_addresses, limit - 1, limit)
+            return
+
+        if size:
+            node_addresses = list(node_addresses)
+            size = len(node_addresses)
+        else:
+            size = None
+
         position = 1
         for node, address in node_addresses:
-            context = {
-                'address': address,
-                'node': node,
-                'size': len(node_addresses),
-                'position': position,
-            }
-            if self.perform_predicate_test(**context):
-                result.append((node, address))
+            context = Context(node, address, position, size, texts)
+            if self._test_result(evaluator(context), context):
+                yield node, address
+            if position == limit:
+                break
             position += 1
-        return result
 
     def perform_predicate_test(self, **context):
-        from .docpath import Docpath
+        context = Context(
+            context.get('node', None), context.get('address', None),
+            context.get('position', None), context.get('size', None),
+            context.get('texts', None))
+        return self._test_result(self.evaluator(context), context)
 
-        predicate_type = type(ast.parse(self.predicate).body[0])
-        if predicate_type == ast.Assign:
-            raise SyntaxError(
-                "invalid use of assignment operator in: '{}'".format(
-                    self.predicate))
-
-        result = simple_eval(
-            self.predicate, **self._get_evaluation_context(**context))
+    @staticmethod
+    def _test_result(result, context):
+        from .docpath import Docpath
 
         if isinstance(result, Docpath):
-            nodes = result.traverse(context['node'])
-            matches = len(list(nodes))
-            return matches > 0
+            nodes = result._traverse_from(context.node, texts=context.texts)
+            return next(nodes, None) is not None
         elif str(result).isdigit():
-            return result == context.get('position', None)
+            return result == context.position
 
         return bool(result)
 
+
+class TextCache(object):
+
+    # The text of the nodes used in comparisons during a single query, so
+    # the same subtree is not joined into a string again for every context
+    # node.  At most maxsize characters are kept, the least recently used
+    # texts are discarded first.  The order of the document is kept for the
+    # query too, so the docpaths in its predicates share it.
+    maxsize = 1 << 20
+
+    def __init__(self, maxsize=None):
+        if maxsize is not None:
+            self.maxsize = maxsize
+        self._texts = OrderedDict()
+        self._size = 0
+        self._docpaths = {}
+        self.order = None
+
+    def __len__(self):
+        return len(self._texts)
+
+    def astext(self, node):
+        if not node.children:
+            return node.astext()
+
+        key = id(node)
+        entry = self._texts.get(key)
+        if entry is not None:
+            self._texts.move_to_end(key)
+            return entry[1]
+
+        text = node.astext()
+        if len(text) <= self.maxsize:
+            # The node is kept with its text, so its id is not reused.
+            self._texts[key] = (node, text)
+            self._size += len(text)
+            while self._size > self.maxsize:
+                _, (_, evicted) = self._texts.popitem(last=False)
+                self._size -= len(evicted)
+        return text
+
+    def docpath_texts(self, docpath, node):
+        # Absolute docpaths find the same nodes from every context node in
+        # the query, so the texts of these nodes are only found once.  They
+        # are needed until the end of the query, so are not limited by the
+        # maximum size.
+        entry = self._docpaths.get(id(docpath))
+        if entry is None:
+            entry = self._docpaths[id(docpath)] = (docpath, frozenset(
+                self.astext(n)
+                for n, _ in docpath._traverse_from(node, None, self)))
+        return entry[1]
+
+
+class Constant(object):
+
+    def __init__(self, value):
+        self.value = value
+
+    def __call__(self, context):
+        return self.value
+
+
+class PredicateCompiler(object):
+
+    disallowed_attributes = ('_', 'func_')
+
+    comparisons = {
+        ast.Eq: operator.eq,
+        ast.NotEq: operator.ne,
+        ast.Lt: operator.lt,
+        ast.LtE: operator.le,
+        ast.Gt: operator.gt,
+        ast.GtE: operator.ge,
+    }
+
+    operators = {
+        ast.Add: safe_add,
+        ast.Sub: operator.sub,
+        ast.Mult: safe_mult,
+        ast.Div: operator.truediv,
+        ast.FloorDiv: operator.floordiv,
+        ast.Mod: operator.mod,
+        ast.Not: operator.not_,
+        ast.UAdd: operator.pos,
+        ast.USub: operator.neg,
+    }
+
+    functions = {
+        'count': lambda context, value: count(
+            context.node, value, context.texts),
+        'last': lambda context: context.size,
+        'name': lambda context, *value: name(context.node, *value),
+        'position': lambda context: context.position,
+    }
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+        self.functions_used = set()
+
+    @classmethod
+    def compile(cls, predicate):
+        body = ast.parse(predicate).body
+        if len(body) == 1 and isinstance(body[0], ast.Assign):
+            raise SyntaxError(
+                "invalid use of assignment operator in: '{}'".format(
+                    predicate))
+        if len(body) != 1 or not isinstance(body[0], ast.Expr):
+            raise FeatureNotAvailable(
+                "invalid predicate: '{}'".format(predicate))
+
+        compiler = cls(predicate)
+        expression = body[0].value
+        evaluator = compiler._compile(expression)
+        if isinstance(evaluator, Constant):
+            # Only integers are positions, strings of digits are compared
+            # to the position and are never equal to it.
+            value = evaluator.value
+            numeric = isinstance(value, int) and \
+                not isinstance(value, bool) and value >= 0
+        else:
+            numeric = compiler._numeric(expression)
+        positional = numeric or bool(
+            compiler.functions_used & set(['last', 'position']))
+        size = 'last' in compiler.functions_used
+        if isinstance(evaluator, Constant):
+            limit = int(evaluator.value) if numeric else None
+        else:
+            limit = compiler._limit(expression)
+        lookup = compiler._lookup(expression)
+        return CompiledPredicate(evaluator, positional, size, limit, lookup)
+
+    def _compile(self, node):
+        compiler = getattr(self, '_compile_' + type(node).__name__, None)
+        if compiler is None:
+            raise FeatureNotAvailable(
+                "Sorry, {} is not available in this evaluator".format(
+                    type(node).__name__))
+        return compiler(node)
+
+    def _numeric(self, node):
+        # Whether the expression could evaluate to a number, which would be
+        # compared to the context position.
+        if isinstance(node, (ast.Compare, ast.Name, ast.Attribute,
+                             ast.Subscript)):
+            return False
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return False
+        if isinstance(node, ast.BinOp) and \
+                isinstance(node.op, (ast.Div, ast.FloorDiv)) and \
+                self._path(node.left) and self._path(node.right):
+            return False
+        if isinstance(node, ast.BoolOp):
+            return any(self._numeric(v) for v in node.values)
+        if isinstance(node, ast.IfExp):
+            return self._numeric(node.body) or self._numeric(node.orelse)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            return node.func.id not in ('id', 'name')
+        if type(node).__name__ in ('Constant', 'Num', 'Str', 'NameConstant'):
+            value = self._compile(node).value
+            return str(value).isdigit()
+        return True
+
+    def _limit(self, node):
+        # The largest context position that the expression can be true for.
+        if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+            limits = [self._limit(v) for v in node.values]
+            limits = [limit for limit in limits if limit is not None]
+            return min(limits) if limits else None
+
+        if not isinstance(node, ast.Compare) or len(node.ops) != 1:
+            return None
+
+        left, op, right = node.left, type(node.ops[0]), node.comparators[0]
+        if self._position(right):
+            left, right = right, left
+            op = {ast.Gt: ast.Lt, ast.GtE: ast.LtE, ast.Eq: ast.Eq}.get(op)
+        if not self._position(left):
+            return None
+
+        value = self._compile(right)
+        if not isinstance(value, Constant) or \
+                not isinstance(value.value, int) or \
+                isinstance(value.value, bool):
+            return None
+        if op is ast.Lt:
+            return value.value - 1
+        if op in (ast.LtE, ast.Eq):
+            return value.value
+        return None
+
+    def _lookup(self, node):
+        # The attribute and value of a comparison that can be found from the
+        # ids and names of the document.  Values with spaces can match more
+        # than one id or name, so they are not looked up.
+        if not isinstance(node, ast.Compare) or len(node.ops) != 1 or \
+                not isinstance(node.ops[0], ast.Eq):
+            return None
+
+        left, right = node.left, node.comparators[0]
+        if not self._identifier(left):
+            left, right = right, left
+        if not self._identifier(left):
+            return None
+
+        value = self._compile(right)
+        if not isinstance(value, Constant) or \
+                not isinstance(value.value, str) or \
+                value.value.split() != [value.value]:
+            return None
+        return left.attr, value.value
+
     @staticmethod
-    def _get_evaluation_context(**context):
-        node = context.get('node', None)
-        position = context.get('position', None)
-        size = context.get('size', None)
-
-        def name_handler(name):
-            try:
-                return Axis(name.id)
-            except ValueError:
-                return getattr(Axis('child'), name.id)
-
-        return {
-            'functions': {
-                'count': lambda x: count(node, x),
-                'last': lambda: size,
-                'name': lambda *x: name(node, *x),
-                'position': lambda: position,
-            },
-            'names': name_handler,
-            'operators': {
-                ast.Eq: lambda l, r: compare(node, l, r, operator.eq),
-                ast.NotEq: lambda l, r: compare(node, l, r, operator.ne),
-                ast.Lt: lambda l, r: compare(node, l, r, operator.lt),
-                ast.LtE: lambda l, r: compare(node, l, r, operator.le),
-                ast.Gt: lambda l, r: compare(node, l, r, operator.gt),
-                ast.GtE: lambda l, r: compare(node, l, r, operator.ge),
-                ast.Add: safe_add,
-                ast.Sub: operator.sub,
-                ast.Mult: safe_mult,
-                ast.Div: operator.truediv,
-                ast.FloorDiv: operator.floordiv,
-                ast.Mod: operator.mod,
-                ast.And: operator.and_,
-                ast.Or: operator.or_,
-                ast.Not: operator.not_,
-                ast.UAdd: operator.pos,
-                ast.USub: operator.neg,
-            },
-        }
-
-
-def compare(node, left, right, op):
+    def _identifier(node):
+        return isinstance(node, ast.Attribute) and \
+            node.attr in ('ids', 'names') and \
+            isinstance(node.value, ast.Name) and node.value.id == 'attribute'
+
+    @staticmethod
+    def _position(node):
+        return isinstance(node, ast.Call) and \
+            isinstance(node.func, ast.Name) and node.func.id == 'position' \
+            and not node.args
+
+    def _path(self, node):
+        if isinstance(node, (ast.Name, ast.Attribute, ast.Subscript)):
+            return True
+        return isinstance(node, ast.BinOp) and \
+            isinstance(node.op, (ast.Div, ast.FloorDiv)) and \
+            self._path(node.left) and self._path(node.right)
+
+    def _operator(self, op):
+        try:
+            return self.operators[type(op)]
+        except KeyError:
+            raise OperatorNotDefined(op, self.predicate)
+
+    def _compile_Constant(self, node):
+        value = node.value
+        if hasattr(value, '__len__') and len(value) > MAX_STRING_LENGTH:
+            raise IterableTooLong(
+                "Literal in statement is too long! "
+                "({}, when {} is max)".format(len(value), MAX_STRING_LENGTH))
+        return Constant(value)
+
+    def _compile_Num(self, node):
+        return Constant(node.n)
+
+    def _compile_Str(self, node):
+        if len(node.s) > MAX_STRING_LENGTH:
+            raise IterableTooLong(
+                "Literal in statement is too long! "
+                "({}, when {} is max)".format(len(node.s), MAX_STRING_LENGTH))
+        return Constant(node.s)
+
+    def _compile_NameConstant(self, node):
+        return Constant(node.value)
+
+    def _compile_JoinedStr(self, node):
+        values = [self._compile(v) for v in node.values]
+
+        def evaluate(context):
+            length = 0
+            result = []
+            for value in values:
+                value = str(value(context))
+                length += len(value)
+                if length > MAX_STRING_LENGTH:
+                    raise IterableTooLong(
+                        "Sorry, I will not evaluate something this long.")
+                result.append(value)
+            return ''.join(result)
+
+        if all(isinstance(v, Constant) for v in values):
+            return Constant(evaluate(None))
+        return evaluate
+
+    def _compile_FormattedValue(self, node):
+        value = self._compile(node.value)
+        conversion = {
+            ord('s'): str, ord('r'): repr, ord('a'): ascii,
+        }.get(node.conversion)
+        format_spec = self._compile(node.format_spec) \
+            if node.format_spec is not None else Constant('')
+
+        def evaluate(context):
+            result = value(context)
+            if conversion is not None:
+                result = conversion(result)
+            return format(result, format_spec(context))
+
+        if isinstance(value, Constant) and isinstance(format_spec, Constant):
+            return Constant(evaluate(None))
+        return evaluate
+
+    def _compile_Name(self, node):
+        try:
+            return Constant(Axis(node.id))
+        except ValueError:
+            return Constant(getattr(Axis('child'), node.id))
+
+    def _compile_Attribute(self, node):
+        if node.attr.startswith(self.disallowed_attributes):
+            raise FeatureNotAvailable(
+                "Sorry, access to {} is not available".format(node.attr))
+
+        value = self._compile(node.value)
+        if not isinstance(value, Constant) or \
+                not isinstance(value.value, Axis):
+            raise FeatureNotAvailable(
+                "Sorry, attribute access is only available on axes")
+        return Constant(getattr(value.value, node.attr))
+
+    def _compile_Index(self, node):
+        return self._compile(node.value)
+
+    def _compile_Subscript(self, node):
+        value = self._compile(node.value)
+        key = self._compile(node.slice)
+        if not isinstance(value, Constant) or not isinstance(key, Constant):
+            raise FeatureNotAvailable(
+                "Sorry, only constant subscripts are available")
+        return Constant(value.value[str(key.value)])
+
+    def _compile_UnaryOp(self, node):
+        op = self._operator(node.op)
+        operand = self._compile(node.operand)
+        if isinstance(operand, Constant):
+            return Constant(op(operand.value))
+        return lambda context: op(operand(context))
+
+    def _compile_BinOp(self, node):
+        op = self._operator(node.op)
+        left = self._compile(node.left)
+        right = self._compile(node.right)
+        if isinstance(left, Constant) and isinstance(right, Constant):
+            return Constant(op(left.value, right.value))
+        return lambda context: op(left(context), right(context))
+
+    def _compile_BoolOp(self, node):
+        values = [self._compile(v) for v in node.values]
+
+        if isinstance(node.op, ast.And):
+            def evaluate(context):
+                for value in values:
+                    result = value(context)
+                    if not result:
+                        break
+                return result
+        elif isinstance(node.op, ast.Or):
+            def evaluate(context):
+                for value in values:
+                    result = value(context)
+                    if result:
+                        break
+                return result
+        else:
+            raise OperatorNotDefined(node.op, self.predicate)
+        return evaluate
+
+    def _compile_Compare(self, node):
+        from .docpath import Docpath
+
+        try:
+            ops = [self.comparisons[type(op)] for op in node.ops]
+        except KeyError:
+            raise FeatureNotAvailable(
+                "Sorry, this comparison is not available")
+        operands = [self._compile_operand(node.left)] + [
+            self._compile_operand(c) for c in node.comparators]
+
+        if len(ops) == 1:
+            left, right = operands
+            op = ops[0]
+            left, right = (
+                self._compile_count(node.left, right) or left,
+                self._compile_count(node.comparators[0], left) or right)
+            if isinstance(left, Constant) and isinstance(right, Constant) \
+                    and not isinstance(left.value, Docpath) \
+                    and not isinstance(right.value, Docpath):
+                return Constant(op(left.value, right.value))
+            if isinstance(right, Constant):
+                value = right.value
+                return lambda context: compare(
+                    context.node, left(context), value, op, context.texts)
+            return lambda context: compare(
+                context.node, left(context), right(context), op,
+                context.texts)
+
+        def evaluate(context):
+            right = operands[0](context)
+            result = True
+            for op, operand in zip(ops, operands[1:]):
+                if not result:
+                    break
+                left, right = right, operand(context)
+                result = compare(
+                    context.node, left, right, op, context.texts)
+            return result
+        return evaluate
+
+    def _compile_count(self, node, other):
+        # Comparing a count with a whole number is decided once there is one
+        # more node than that number, so counting can stop there.
+        if not isinstance(node, ast.Call) or \
+                not isinstance(node.func, ast.Name) or \
+                node.func.id != 'count' or len(node.args) != 1 or \
+                node.keywords:
+            return None
+        if not isinstance(other, Constant) or \
+                not isinstance(other.value, int) or \
+                isinstance(other.value, bool):
+            return None
+
+        self.functions_used.add('count')
+        arg = self._compile(node.args[0])
+        limit = max(other.value + 1, 0)
+        return lambda context: count(
+            context.node, arg(context), context.texts, limit)
+
+    def _compile_id(self, node):
+        from .docpath import Docpath, DocpathStep
+
+        args = [self._compile(a) for a in node.args]
+        if len(args) != 1 or not isinstance(args[0], Constant) or \
+                not isinstance(args[0].value, str) or \
+                not args[0].value.split():
+            raise FeatureNotAvailable(
+                "Sorry, id is only available with a constant string")
+        self.functions_used.add('id')
+
+        steps = tuple(
+            DocpathStep(Axis('id'), i) for i in args[0].value.split())
+        return Constant(Docpath(steps[0] if len(steps) == 1 else steps))
+
+    def _compile_operand(self, node):
+        from .docpath import Docpath
+
+        operand = self._compile(node)
+        if isinstance(operand, Constant) and \
+                isinstance(operand.value, Docpath) and operand.value.absolute:
+            docpath = operand.value
+            return lambda context: docpath_texts(context, docpath)
+        return operand
+
+    def _compile_IfExp(self, node):
+        test = self._compile(node.test)
+        body = self._compile(node.body)
+        orelse = self._compile(node.orelse)
+        return lambda context: (
+            body(context) if test(context) else orelse(context))
+
+    def _compile_Call(self, node):
+        if not isinstance(node.func, ast.Name):
+            raise FeatureNotAvailable(
+                "Sorry, only named functions are available")
+        if node.keywords:
+            raise FeatureNotAvailable(
+                "Sorry, keyword arguments are not available")
+        if node.func.id == 'id':
+            return self._compile_id(node)
+        try:
+            function = self.functions[node.func.id]
+        except KeyError:
+            raise FunctionNotDefined(node.func.id, self.predicate)
+        self.functions_used.add(node.func.id)
+
+        args = [self._compile(a) for a in node.args]
+        if not args:
+            return function
+        if len(args) == 1:
+            arg = args[0]
+            return lambda context: function(context, arg(context))
+        return lambda context: function(context, *[a(context) for a in args])
+
+
+def compare(node, left, right, op, texts=None):
     from .docpath import Docpath
 
+    if texts is None:
+        texts = TextCache()
+    if op in (operator.eq, operator.ne):
+        # Finding whether any node has the value, or one of the texts of an
+        # absolute docpath, stops at the first node that does.
+        if isinstance(right, Docpath) and not isinstance(left, Docpath):
+            left, right = right, left
+        if isinstance(left, Docpath) and not isinstance(right, Docpath):
+            if not isinstance(right, (set, frozenset)):
+                right = set((right,))
+            found = any(
+                texts.astext(n) in right
+                for n, _ in left._traverse_from(node, None, texts))
+            return op(found, True)
+
     if isinstance(left, Docpath):
-        left = set([n.astext() for n in left.findall(node)])
+        left = set([
+            texts.astext(n)
+            for n, _ in left._traverse_from(node, None, texts)])
     if isinstance(right, Docpath):
-        right = set([n.astext() for n in right.findall(node)])
+        right = set([
+            texts.astext(n)
+            for n, _ in right._traverse_from(node, None, texts)])
 
-    if isinstance(left, set) or isinstance(right, set):
-        left = left if isinstance(left, set) else set((left,))
-        right = right if isinstance(right, set) else set((right,))
+    if isinstance(left, (set, frozenset)) or \
+            isinstance(right, (set, frozenset)):
+        left = left if isinstance(left, (set, frozenset)) else set((left,))
+        right = right if isinstance(right, (set, frozenset)) else \
+            set((right,))
 
         if op in (operator.eq, operator.ne):
             return op(bool(left & right), True)
@@ -146,11 +637,19 @@ def compare(node, left, right, op):
     return op(left, right)
 
 
-def count(node, value):
+def docpath_texts(context, docpath):
+    texts = context.texts
+    if texts is None:
+        texts = TextCache()
+    return texts.docpath_texts(docpath, context.node)
+
+
+def count(node, value, texts=None, limit=None):
     from .docpath import Docpath
 
     if isinstance(value, Docpath):
-        return len(list(value.findall(node)))
+        nodes = value._traverse_from(node, None, texts)
+        return sum(1 for _ in islice(nodes, limit))
     return len(value)
 
 
@@ -0,0 +1,152 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from time import perf_counter
+
+from .docpath import DocpathStep
+from .predicate import Predicate
+
+
+class DocpathProfile(object):
+
+    def __init__(self):
+        self.rows = []
+        self._stats = {}
+
+    def __str__(self):
+        return self.table()
+
+    @property
+    def steps(self):
+        return [s for _, s in self.rows if isinstance(s, StepProfile)]
+
+    @property
+    def predicates(self):
+        return [s for _, s in self.rows if isinstance(s, PredicateProfile)]
+
+    def add(self, steps, depth=0):
+        if isinstance(steps, DocpathStep):
+            self.step(steps, depth)
+        elif isinstance(steps, Predicate):
+            self.predicate(steps, depth + 1)
+        elif isinstance(steps, tuple):
+            for step in steps:
+                self.add(step, depth + 1)
+        elif isinstance(steps, list):
+            for step in steps:
+                self.add(step, depth)
+
+    def step(self, step, depth=0):
+        return self._get(StepProfile, step, depth)
+
+    def predicate(self, predicate, depth=0):
+        return self._get(PredicateProfile, predicate, depth)
+
+    def _get(self, cls, item, depth):
+        stats = self._stats.get(id(item))
+        if stats is None:
+            stats = self._stats[id(item)] = cls(item)
+            self.rows.append((depth, stats))
+        return stats
+
+    def filter_nodes(self, predicates, node_addresses, texts=None):
+        if predicates:
+            for predicate in predicates:
+                node_addresses = self.predicate(predicate).filter_nodes(
+                    node_addresses, texts)
+        return node_addresses
+
+    def table(self):
+        header = (
+            '', 'contexts', 'visited', 'matched', 'evaluated', 'results',
+            'ms')
+        lines = [header]
+        for depth, stats in self.rows:
+            lines.append(('  ' * depth + stats.name,) + stats.columns())
+
+        width = max(len(line[0]) for line in lines)
+        return '\n'.join(
+            '{:<{}}'.format(line[0], width) +
+            ''.join('{:>10}'.format(column) for column in line[1:])
+            for line in lines)
+
+
+class StepProfile(object):
+
+    def __init__(self, step):
+        self.step = step
+        self.contexts = 0
+        self.visited = 0
+        self.matched = 0
+        self.results = 0
+        self.time = 0.0
+
+    @property
+    def name(self):
+        return str(self.step)
+
+    def columns(self):
+        return (
+            self.contexts, self.visited, self.matched, '', self.results,
+            '{:.3f}'.format(self.time * 1000))
+
+    def count_contexts(self, node_addresses):
+        for node_address in node_addresses:
+            self.contexts += 1
+            yield node_address
+
+    def count_visited(self, nodes):
+        for node in nodes:
+            self.visited += 1
+            yield node
+
+    def count_matched(self, node_addresses):
+        for node_address in node_addresses:
+            self.matched += 1
+            yield node_address
+
+    def count_results(self, node_addresses):
+        node_addresses = iter(node_addresses)
+        while True:
+            start = perf_counter()
+            node_address = next(node_addresses, None)
+            self.time += perf_counter() - start
+            if node_address is None:
+                return
+            self.results += 1
+            yield node_address
+
+
+class PredicateProfile(object):
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+        self.evaluated = 0
+        self.results = 0
+        self.time = 0.0
+
+    @property
+    def name(self):
+        return '[{}]'.format(self.predicate)
+
+    def columns(self):
+        return (
+            '', '', '', self.evaluated, self.results,
+            '{:.3f}'.format(self.time * 1000))
+
+    def count_evaluated(self, node_addresses):
+        for node_address in node_addresses:
+            self.evaluated += 1
+            yield node_address
+
+    def filter_nodes(self, node_addresses, texts=None):
+        node_addresses = self.predicate._filter_nodes(
+            self.count_evaluated(node_addresses), texts)
+        while True:
+            start = perf_counter()
+            node_address = next(node_addresses, None)
+            self.time += perf_counter() - start
+            if node_address is None:
+                return
+            self.results += 1
+            yield node_address
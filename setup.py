@@ -2,6 +2,8 @@
 # This file is part of the docpath package.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
+import re
+
 from os.path import dirname, join
 from setuptools import setup, find_packages
 
@@ -11,9 +13,15 @@ def read(fname):
         return file.read()
 
 
+def version():
+    return re.search(
+        r"^__version__ = '([^']+)'$", read(join('docpath', 'version.py')),
+        re.MULTILINE).group(1)
+
+
 setup(
     name='docpath',
-    version='0.1.1',
+    version=version(),
     description="XPath style paths for docutils document trees.",
     long_description=read('README.rst'),
     author='David Harper',
@@ -41,7 +49,7 @@ setup(
     ],
     license='GPL-3',
     platforms='any',
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['benchmarks', 'tests']),
     python_requires='>=3.5',
     install_requires=[
         'docutils>=0.14',
@@ -1,9 +1,11 @@
 # This file is part of the docpath package.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
+from docpath import path
 from docpath.axis import Axis
 from docutils import nodes
 from docutils.core import publish_doctree
+from docutils.utils import new_document
 from os.path import dirname, join
 from unittest import TestCase
 
@@ -15,7 +17,6 @@ class TestAxis(TestCase):
         with open(source, 'r', encoding='utf-8') as rst:
             self.doctree = publish_doctree(rst.read())
         self.node = self.doctree.next_node(self._matches_node_i)
-        self.address = Axis.node_address(self.node)
 
     @staticmethod
     def _matches_node_i(node):
@@ -23,20 +24,16 @@ class TestAxis(TestCase):
 
     def assertAttributeTraversal(self, traverse, matches):
         attributes = set([
-            n.name for n, _ in traverse(self.node, self.address)])
+            n.name for n in traverse(self.node)])
         self.assertEqual(attributes, matches)
 
     def assertNameTraversal(self, traverse, matches):
         names = [
             ', '.join(n['names'])
-            for n, _ in traverse(self.node, self.address)
+            for n in traverse(self.node)
             if not isinstance(n, nodes.Text) and n['names']]
         self.assertEqual(names, matches)
 
-    def test_axis_node_address(self):
-        "Test the node address is calculated correctly."
-        self.assertEqual(Axis.node_address(self.node), (1, 4, 3))
-
     def test_axis_traverse_ancestor(self):
         "Test the ancestor doctree traversal."
         self.assertNameTraversal(
@@ -61,6 +58,40 @@ class TestAxis(TestCase):
             Axis('attribute').traverse,
             set(['backrefs', 'names', 'classes', 'dupnames', 'ids']))
 
+    def test_axis_traverse_attribute_name(self):
+        "Test the attribute doctree traversal of a single attribute."
+        names, = Axis('attribute').traverse_name(self.node, 'names')
+        self.assertEqual(names.name, 'names')
+        self.assertEqual(names.value, ['i'])
+        self.assertIs(names.parent, self.node)
+        self.assertEqual(
+            Axis('attribute').traverse_name(self.node, 'unknown'), ())
+        self.assertEqual(
+            Axis('attribute').traverse_name(names, 'names'), ())
+
+    def test_axis_attribute_astext(self):
+        "Test the text of attribute nodes follows their value."
+        names, = Axis('attribute').traverse_name(self.node, 'names')
+        self.assertEqual(names.astext(), 'i')
+        self.node['names'].append('x')
+        self.assertEqual(names.astext(), 'i x')
+        names.value = 3
+        self.assertEqual(names.astext(), '3')
+        self.assertFalse(hasattr(names, '__dict__'))
+
+    def test_axis_traverse_id(self):
+        "Test the id doctree traversal."
+        self.assertNameTraversal(
+            lambda n: [m for m in Axis('id').traverse(n)][:4],
+            ['c', 'd', 'e', 'f'])
+        self.assertEqual(
+            Axis('id').traverse_name(self.node, 'j'),
+            (self.node.children[1],))
+        self.assertEqual(Axis('id').traverse_name(self.node, 'unknown'), ())
+
+        self.doctree.ids['x'] = nodes.section(ids=['x'])
+        self.assertEqual(Axis('id').traverse_name(self.node, 'x'), ())
+
     def test_axis_traverse_child(self):
         "Test the child doctree traversal."
         self.assertNameTraversal(
@@ -150,3 +181,78 @@ class TestAxis(TestCase):
         self.assertNameTraversal(
             Axis('self').traverse_backwards,
             ['i'])
+
+    def test_axis_node_position(self):
+        "Test the position of a node in its parent is found."
+        parent = self.node.parent
+        self.assertIs(parent[Axis.node_position(self.node)], self.node)
+        self.assertIsNone(Axis.node_position(self.doctree))
+
+    def test_axis_node_position_changed(self):
+        "Test the position of a node is found after its parent changes."
+        parent = self.node.parent
+        position = Axis.node_position(self.node)
+        parent.insert(0, nodes.section())
+        self.assertEqual(Axis.node_position(self.node), position + 1)
+        parent.remove(parent[0])
+        Axis.invalidate_positions(parent)
+        self.assertEqual(Axis.node_position(self.node), position)
+
+    def test_axis_node_position_attribute(self):
+        "Test attribute nodes do not have a position."
+        attribute = next(Axis('attribute').traverse(self.node))
+        self.assertIsNone(Axis.node_position(attribute))
+        self.assertEqual(
+            list(Axis('following_sibling').traverse(attribute)), [])
+
+
+class TestAxisDeepDoctree(TestCase):
+
+    depth = 5000
+
+    def setUp(self):
+        self.doctree = new_document('<deep>')
+        node = self.doctree
+        for i in range(self.depth):
+            child = nodes.paragraph()
+            node += child
+            if i:
+                node += nodes.Text(str(i - 1))
+            node = child
+        node += nodes.Text(str(self.depth - 1))
+        self.node = node
+
+    def test_axis_deep_descendant(self):
+        "Test the descendant traversal of a deep doctree."
+        descendants = list(Axis('descendant').traverse(self.doctree))
+        self.assertEqual(len(descendants), self.depth * 2)
+        self.assertEqual(descendants[-1], '0')
+        self.assertEqual(
+            list(Axis('descendant').traverse_backwards(self.doctree)),
+            list(reversed(descendants)))
+
+    def test_axis_deep_following(self):
+        "Test the following doctree traversal of a deep doctree."
+        following = list(Axis('following').traverse(self.node[0]))
+        self.assertEqual(len(following), self.depth - 1)
+        self.assertEqual(following[0], str(self.depth - 2))
+        self.assertEqual(
+            list(Axis('following').traverse_backwards(self.node[0])),
+            list(reversed(following)))
+
+    def test_axis_deep_preceding(self):
+        "Test the preceding doctree traversal of a deep doctree."
+        node = self.doctree[0][0]
+        preceding = list(Axis('preceding').traverse(node.parent[1]))
+        self.assertEqual(len(preceding), self.depth * 2 - 2)
+        self.assertEqual(
+            list(Axis('preceding').traverse_backwards(node.parent[1])),
+            list(reversed(preceding)))
+
+    def test_axis_deep_docpath(self):
+        "Test a docpath can search a deep doctree."
+        self.assertEqual(
+            len(list(path('//paragraph').findall(self.doctree))), self.depth)
+        self.assertIs(
+            path('//paragraph[count(paragraph) == 0]').find(self.doctree),
+            self.node)
@@ -0,0 +1,119 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import pickle
+
+from docpath import DocpathBatch, path
+from docpath.axis import Attribute, Axis
+from docutils.core import publish_doctree
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+
+class TestDocpathBatch(TestCase):
+
+    def setUp(self):
+        self.source = join(dirname(__file__), 'doc', 'doctree.rst')
+        with open(self.source, 'r', encoding='utf-8') as rst:
+            self.doctree = publish_doctree(rst.read())
+        self.docpaths = [path('//section/title'), path('//section/@names')]
+
+    def expected(self, docpath, projection):
+        positions = {
+            id(n): i for i, n in enumerate(
+                Axis('descendant_or_self').traverse(self.doctree))}
+        results = []
+        for node in docpath.findall(self.doctree):
+            element = node.parent if isinstance(node, Attribute.Node) else node
+            results.append(projection(node, positions[id(element)]))
+        return results
+
+    def test_batch_pickle_docpath(self):
+        "Test docpaths can be pickled."
+        docpath = path('//section[title == "K"]/@ids')
+        list(docpath.findall(self.doctree))
+        unpickled = pickle.loads(pickle.dumps(docpath))
+        self.assertEqual(str(unpickled), str(docpath))
+        self.assertEqual(
+            [n.value for n in unpickled.findall(self.doctree)], [['k']])
+
+    def test_batch_documents(self):
+        "Test batch evaluation of documents in the current process."
+        batch = DocpathBatch(self.docpaths, max_workers=0)
+        results = list(batch.evaluate([self.doctree, self.doctree]))
+        expected = [
+            self.expected(d, lambda n, a: a) for d in self.docpaths]
+        self.assertEqual(results, [expected, expected])
+
+    def test_batch_addresses(self):
+        "Test nodes are projected to their position in document order."
+        count = len(list(Axis('descendant_or_self').traverse(self.doctree)))
+        batch = DocpathBatch(
+            [path('/descendant_or_self::node'), path('/*[2]/@names'),
+             path('/section[2]/title')], max_workers=0)
+        self.assertEqual(
+            list(batch.evaluate([self.doctree])),
+            [[list(range(count)), [3], [9]]])
+
+    def test_batch_single_docpath(self):
+        "Test batch evaluation of a single docpath."
+        batch = DocpathBatch(self.docpaths[0], 'text', max_workers=0)
+        self.assertEqual(
+            list(batch.evaluate([self.doctree])),
+            [self.expected(self.docpaths[0], lambda n, a: n.astext())])
+
+    def test_batch_projections(self):
+        "Test the projections of the matching nodes."
+        docpath = path('//section[title == "K"]/(title|@names)')
+        results = [
+            list(DocpathBatch(docpath, p, max_workers=0).evaluate(
+                [self.doctree]))[0]
+            for p in ['name', 'text', 'attributes']]
+        self.assertEqual(results[0], ['names', 'title'])
+        self.assertEqual(results[1], ['k', 'K'])
+        self.assertEqual(results[2][0], {'names': ['k']})
+        self.assertEqual(results[2][1]['ids'], [])
+
+    def test_batch_invalid(self):
+        "Test invalid batch parameters."
+        with self.assertRaises(ValueError):
+            DocpathBatch(self.docpaths, 'unknown')
+        with self.assertRaises(ValueError):
+            DocpathBatch(self.docpaths, max_workers=-1)
+        with self.assertRaises(ValueError):
+            DocpathBatch(self.docpaths, chunksize=0)
+
+    def test_batch_process_pool(self):
+        "Test batch evaluation of sources in a process pool."
+        with TemporaryDirectory() as directory:
+            pickled = join(directory, 'doctree.doctree')
+            with open(pickled, 'wb') as file:
+                pickle.dump(self.doctree, file)
+
+            sources = [self.source, pickled] * 3
+            batch = DocpathBatch(
+                self.docpaths, 'text', max_workers=2, chunksize=2,
+                settings={'report_level': 5})
+            results = list(batch.evaluate(sources))
+
+        expected = [
+            self.expected(d, lambda n, a: n.astext()) for d in self.docpaths]
+        self.assertEqual(results, [expected] * 6)
+
+    def test_batch_process_pool_window(self):
+        "Test only a few documents are queued for the process pool."
+        pulled = []
+
+        def sources():
+            for _ in range(20):
+                pulled.append(self.source)
+                yield self.source
+
+        batch = DocpathBatch(
+            self.docpaths[0], 'name', max_workers=1,
+            settings={'report_level': 5})
+        results = batch.evaluate(sources())
+        self.assertEqual(next(results), ['title'] * 21)
+        self.assertLessEqual(len(pulled), 4)
+        self.assertEqual(len(list(results)), 19)
@@ -0,0 +1,159 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+import os
+import pickle
+
+from docpath import __version__, path
+from docpath.cache import PathCache
+from docpath.parser import DocpathParser
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+from unittest import TestCase
+
+
+class TestPathCache(TestCase):
+
+    def setUp(self):
+        self.cache = PathCache(DocpathParser, maxsize=2)
+
+    def test_cache_hit(self):
+        "Test a cached path is reused."
+        docpath = self.cache.get('//section/title')
+        self.assertIs(self.cache.get('//section/title'), docpath)
+        self.assertEqual(tuple(self.cache.info()), (1, 1, 2, 1))
+
+    def test_cache_normalized(self):
+        "Test equivalent paths share the same cache entry."
+        docpath = self.cache.get('//section')
+        self.assertIs(
+            self.cache.get('/descendant_or_self::node/child::section'),
+            docpath)
+        self.assertIs(self.cache.get('// section'), docpath)
+        self.assertEqual(tuple(self.cache.info()), (2, 1, 2, 1))
+
+    def test_cache_eviction(self):
+        "Test the least recently used path is evicted."
+        section = self.cache.get('section')
+        self.cache.get('title')
+        self.cache.get('section')
+        self.cache.get('paragraph')
+        self.assertEqual(len(self.cache), 2)
+        self.assertIs(self.cache.get('section'), section)
+        self.cache.get('title')
+        self.assertEqual(tuple(self.cache.info()), (2, 4, 2, 2))
+
+    def test_cache_resize(self):
+        "Test the cache can be resized."
+        self.cache.get('section')
+        self.cache.get('title')
+        self.cache.resize(1)
+        self.assertEqual(len(self.cache), 1)
+        self.cache.resize(0)
+        self.cache.get('section')
+        self.assertEqual(len(self.cache), 0)
+        with self.assertRaises(ValueError):
+            self.cache.resize(-1)
+
+    def test_cache_clear(self):
+        "Test the cache can be cleared."
+        docpath = self.cache.get('section')
+        self.cache.clear()
+        self.assertEqual(tuple(self.cache.info()), (0, 0, 2, 0))
+        self.assertIsNot(self.cache.get('section'), docpath)
+
+    def test_cache_threads(self):
+        "Test the cache can be used from multiple threads."
+        paths = ['section', 'title', 'paragraph', '//section', '..']
+
+        def lookup():
+            for _ in range(100):
+                for docpath in paths:
+                    self.cache.get(docpath)
+
+        threads = [Thread(target=lookup) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        info = self.cache.info()
+        self.assertEqual(info.hits + info.misses, 2000)
+        self.assertEqual(info.currsize, 2)
+
+    def test_cache_threads_parse(self):
+        "Test different docpaths are parsed at the same time."
+        started, release, calls, released = Event(), Event(), [], []
+
+        class Parser(DocpathParser):
+
+            @classmethod
+            def parse(cls, docpath):
+                calls.append(docpath)
+                if docpath == 'section':
+                    started.set()
+                    released.append(release.wait(10))
+                return super().parse(docpath)
+
+        cache = PathCache(Parser)
+        threads = [
+            Thread(target=cache.get, args=('section',)) for _ in range(3)]
+        threads[0].start()
+        self.assertTrue(started.wait(10))
+        for thread in threads[1:]:
+            thread.start()
+
+        self.assertEqual(str(cache.get('title')), 'child::title')
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(released, [True])
+        self.assertEqual(calls, ['section', 'title'])
+        self.assertEqual(tuple(cache.info()), (2, 2, 1024, 2))
+
+    def test_cache_save_load(self):
+        "Test the cached paths can be saved to, and loaded from, a file."
+        with TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'paths.cache')
+            self.cache.get('//section')
+            self.cache.get('// section')
+            self.cache.get('title[1]')
+            self.cache.save(filename)
+            self.assertEqual(os.listdir(directory), ['paths.cache'])
+
+            cache = PathCache(DocpathParser)
+            self.assertEqual(cache.load(filename), 2)
+            self.assertEqual(
+                str(cache.get('// section')),
+                '/descendant_or_self::node/child::section')
+            self.assertEqual(
+                str(cache.get('child::title[1]')), 'child::title[1]')
+            self.assertEqual(tuple(cache.info()), (2, 0, 1024, 2))
+
+    def test_cache_load_invalid(self):
+        "Test invalid or out of date cache files are ignored."
+        with TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'paths.cache')
+            self.assertEqual(self.cache.load(filename), 0)
+
+            with open(filename, 'wb') as file:
+                file.write(b'invalid')
+            self.assertEqual(self.cache.load(filename), 0)
+
+            with open(filename, 'wb') as file:
+                pickle.dump(('0.0.0', [('child::section', [], None)]), file)
+            self.assertEqual(self.cache.load(filename), 0)
+            self.assertEqual(len(self.cache), 0)
+
+            for entries in [
+                    None, [None], [('child::section', [])],
+                    [(['child::section'], [], None)],
+                    [('child::section', ['section', 1], None)],
+                    [('child::section', [], None), ('child::title', 1, None)],
+                    [('child::section', ['section'], 'oops')],
+                    [('child::section', 'abc', path('section'))]]:
+                with open(filename, 'wb') as file:
+                    pickle.dump((__version__, entries), file)
+                self.assertEqual(self.cache.load(filename), 0)
+                self.assertEqual(len(self.cache), 0)
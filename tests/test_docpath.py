@@ -1,11 +1,12 @@
 # This file is part of the docpath package.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
-from docpath import path
-from docpath.axis import Axis
+from docpath import DocpathProfile, DocumentIndex, path
+from docpath.axis import Attribute, Axis
 from docpath.docpath import Docpath, DocpathStep
 from docutils import nodes
 from docutils.core import publish_doctree
+from docutils.utils import new_document
 from os.path import dirname, join
 from unittest import TestCase
 
@@ -41,13 +42,47 @@ class TestDocpath(TestCase):
             DocpathStep(Axis('child'), 'section')))
         self.assertEqual(str(path), '(root::node|child::section)')
 
+    def test_docpath_absolute(self):
+        "Test whether docpaths start from the root of the document."
+        for docpath, absolute in [
+                ('/section', True), ('//section/title', True),
+                ('/section | //title', True), ('section', False),
+                ('/section | title', False), ('.//section', False),
+                ('id("i")/title', True)]:
+            self.assertEqual(path(docpath).absolute, absolute, docpath)
+
     def test_docpath_traverse(self):
         "Test docpath traverse."
         docpath = path('//section')
         self.assertEqual(
             [', '.join(n['names']) for n, a in docpath.traverse(self.node)],
-            ['c', 'd', 'e', 'v', 'w', 'f', 'h', 'i', 's', 't', 'g', 'j', 'k',
-             'n', 'o', 'p', 'l', 'm', 'q', 'r', 'u'])
+            ['c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm', 'n', 'o',
+             'p', 'q', 'r', 's', 't', 'u', 'v', 'w'])
+
+    def test_docpath_traverse_reverse_axis(self):
+        "Test docpath traverse of a reverse axis is in document order."
+        docpath = path('//section/ancestor::section[1]')
+        self.assertEqual(
+            [', '.join(n['names']) for n, a in docpath.traverse(self.node)],
+            ['e', 'f', 'i', 'k', 'p', 't'])
+        docpath = path('preceding_sibling::section')
+        self.assertEqual(
+            [', '.join(n['names']) for n, a in docpath.traverse(self.node)],
+            ['f', 'h'])
+
+    def test_docpath_traverse_lazy(self):
+        "Test docpath traverse only visits the context nodes it needs to."
+        contexts = []
+
+        def traverse(node):
+            contexts.append(node)
+            return iter([(node, node)])
+
+        node_addresses = iter([(n, n) for n in range(10)])
+        results = Docpath._merge(node_addresses, traverse, True)
+        self.assertEqual(next(results), (0, 0))
+        self.assertEqual(next(results), (1, 1))
+        self.assertEqual(contexts, [0, 1])
 
     def test_docpath_findall(self):
         "Test docpath findall."
@@ -64,6 +99,65 @@ class TestDocpath(TestCase):
             docpath.find(self.node)['names'],
             ['c'])
 
+    def test_docpath_or_predicate(self):
+        "Test docpaths or with a predicate uses document order."
+        docpath = path('(//subtitle|/self::document)[1]')
+        self.assertEqual(
+            [', '.join(n['names']) for n in docpath.findall(self.node)],
+            ['a'])
+
+    def test_docpath_unique(self):
+        "Test docpaths do not find the same node more than once."
+        docpath = path('//title/..')
+        self.assertEqual(
+            [', '.join(n['names']) for n in docpath.findall(self.node)],
+            ['a', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm', 'n',
+             'o', 'p', 'q', 'r', 's', 't', 'u', 'v', 'w'])
+        docpath = path('(//section|//section/title/..)[position() <= 2]')
+        self.assertEqual(
+            [', '.join(n['names']) for n in docpath.findall(self.node)],
+            ['c', 'd'])
+        docpath = path('//section/descendant::section')
+        self.assertEqual(
+            [', '.join(n['names']) for n in docpath.findall(self.node)],
+            ['f', 'g', 'h', 'i', 'j', 'k', 'l', 'm', 'n', 'o', 'p', 'q', 'r',
+             's', 't', 'u'])
+
+    def test_docpath_immutable(self):
+        "Test docpaths can not be changed once they are created."
+        docpath = path('//section[title == "K"]')
+        step = docpath.steps[-2]
+        predicate = docpath.steps[-1]
+        for obj, name in [(docpath, 'steps'), (docpath, 'optimize'),
+                          (step, 'axis'), (step, 'node_test'),
+                          (predicate, 'predicate'), (step.axis, 'name')]:
+            with self.assertRaises(AttributeError):
+                setattr(obj, name, None)
+
+    def test_docpath_axis_singletons(self):
+        "Test the axes of docpath steps are shared."
+        self.assertIs(Axis('child'), Axis('child'))
+        self.assertIs(
+            path('//section').steps[-1].axis, path('child::title').steps.axis)
+
+    def test_docpath_unique_attribute_contexts(self):
+        "Test attribute context nodes are not inside their element."
+        docpath = path('(.|@ids)/descendant_or_self::ids')
+        self.assertEqual(
+            [n.name for n in docpath.findall(self.node)
+             if isinstance(n, Attribute.Node)],
+            ['ids'])
+
+    def test_docpath_unique_attributes(self):
+        "Test docpaths do not find the same attribute more than once."
+        docpath = path('(section/@ids|section/@names|section/@ids)')
+        self.assertEqual(
+            [(n.parent['names'][0], n.name)
+             for n in docpath.findall(self.node)],
+            [('j', 'ids'), ('j', 'names'), ('k', 'ids'), ('k', 'names'),
+             ('n', 'ids'), ('n', 'names'), ('o', 'ids'), ('o', 'names'),
+             ('p', 'ids'), ('p', 'names')])
+
     def test_docpath_find_nothing(self):
         "Test docpath find that returns None."
         docpath = path('paragraph')
@@ -77,6 +171,17 @@ class TestDocpath(TestCase):
             ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm',
              'n', 'o', 'p', 'q', 'r', 's', 't', 'u', 'v', 'w'])
 
+    def test_docpath_attribute_parent(self):
+        "Test docpath from attributes to their elements."
+        docpath = path('section/@ids/..')
+        self.assertEqual(
+            [', '.join(n['names']) for n in docpath.findall(self.node)],
+            ['j', 'k', 'n', 'o', 'p'])
+        self.assertEqual(
+            [n.__class__.__name__ for n in path('@ids/..').findall(
+                nodes.section(ids=['x']))],
+            ['section'])
+
 
 class TestDocpathStep(TestCase):
 
@@ -85,11 +190,11 @@ class TestDocpathStep(TestCase):
         with open(source, 'r', encoding='utf-8') as rst:
             self.doctree = publish_doctree(rst.read())
         self.node = self.doctree.next_node(self._matches_node_i)
-        self.node_addresses = [
-            (nodes.section(), ()),
-            (nodes.paragraph(), ()),
-            (nodes.comment(), ()),
-            (nodes.Text('text'), ())]
+        self.nodes = [
+            nodes.section(),
+            nodes.paragraph(),
+            nodes.comment(),
+            nodes.Text('text')]
 
     @staticmethod
     def _matches_node_i(node):
@@ -97,25 +202,115 @@ class TestDocpathStep(TestCase):
 
     def assertFilterNodes(self, node_test, matches):
         step = DocpathStep(Axis('child'), node_test)
-        filtered_nodes = step.filter_nodes(self.node_addresses)
+        filtered_nodes = step.filter_nodes(self.nodes)
         self.assertEqual(list(filtered_nodes), matches)
 
     def test_docpathstep_filter_nodes_node(self):
         "Test docpath step filter nodes for nodes."
-        self.assertFilterNodes('node', self.node_addresses)
+        self.assertFilterNodes('node', self.nodes)
 
     def test_docpathstep_filter_nodes_element(self):
         "Test docpath step filter nodes for elements."
-        self.assertFilterNodes('element', self.node_addresses[:2])
+        self.assertFilterNodes('element', self.nodes[:2])
 
     def test_docpathstep_filter_nodes_comment(self):
         "Test docpath step filter nodes for comments."
-        self.assertFilterNodes('comment', self.node_addresses[2:3])
+        self.assertFilterNodes('comment', self.nodes[2:3])
 
     def test_docpathstep_filter_nodes_text(self):
         "Test docpath step filter nodes for text."
-        self.assertFilterNodes('text', self.node_addresses[3:4])
+        self.assertFilterNodes('text', self.nodes[3:4])
 
     def test_docpathstep_filter_nodes_section(self):
         "Test docpath step filter nodes for section."
-        self.assertFilterNodes('section', self.node_addresses[0:1])
+        self.assertFilterNodes('section', self.nodes[0:1])
+
+    def test_docpathstep_filter_nodes_attribute(self):
+        "Test docpath step filter nodes for attributes."
+        attributes = list(Axis('attribute').traverse(self.node))
+        step = DocpathStep(Axis('attribute'), 'names')
+        self.assertEqual(
+            [a.name for a in step.filter_nodes(attributes)], ['names'])
+        step = DocpathStep(Axis('attribute'), 'node')
+        self.assertEqual(list(step.filter_nodes(attributes)), [])
+
+    def test_docpathstep_filter_nodes_subclasses(self):
+        "Test docpath step filter nodes for subclasses."
+        self.nodes.append(subsection())
+        self.assertFilterNodes('section', self.nodes[0:1])
+        try:
+            DocpathStep.match_subclasses = True
+            self.assertFilterNodes('section', [self.nodes[0], self.nodes[4]])
+            self.assertFilterNodes('subsection', self.nodes[4:5])
+            self.assertFilterNodes('Element', self.nodes[:3] + self.nodes[4:])
+        finally:
+            DocpathStep.match_subclasses = False
+        self.assertFilterNodes('section', self.nodes[0:1])
+
+    def test_docpathstep_subclasses_index(self):
+        "Test docpaths matching subclasses do not use the index."
+        self.node.append(subsection())
+        docpath = path('.//section')
+        DocumentIndex.build(self.doctree)
+        try:
+            DocpathStep.match_subclasses = True
+            self.assertIsInstance(list(docpath.findall(self.node))[-1],
+                                  subsection)
+        finally:
+            DocpathStep.match_subclasses = False
+            DocumentIndex.remove(self.doctree)
+        self.assertNotIsInstance(
+            list(docpath.findall(self.node))[-1], subsection)
+
+    def test_docpath_document_ids(self):
+        "Test id and name predicates give the same nodes from the document."
+        self.node.children[1]['ids'].append('z')
+        self.node.children[2]['names'].append('z')
+        self.doctree.nameids['y'] = None
+        self.node.children[3]['names'] = ['y']
+        self.node.append(nodes.section(ids=['new'], names=['new']))
+        docpaths = [
+            '//*[@ids == "k"]', '//section[@ids == "j z"]',
+            '//*[@ids == "j"]', './/section[@names == "i"]',
+            './/*[@names == "k"]/title', '//*[@names == "y"]',
+            '//section[@names == "i"][1]', '//*[@ids == "unknown"]',
+            './descendant_or_self::section[@ids == "i"]',
+            '//section[@ids == "new"]', '//*[@names == "new"]']
+
+        results = []
+        for use_document_ids in [False, True]:
+            Docpath.use_document_ids = use_document_ids
+            try:
+                results.append([
+                    [', '.join(n['names']) for n in path(d).findall(
+                        self.node)]
+                    for d in docpaths])
+            finally:
+                Docpath.use_document_ids = True
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(
+            results[1],
+            [['k, z'], ['j'], [], [], [], ['y'], ['i'], [], ['i'], ['new'],
+             ['new']])
+
+    def test_docpath_document_ids_visited(self):
+        "Test id and name predicates only visit the node they look up."
+        profile = DocpathProfile()
+        list(path('//*[@ids == "k"]').traverse(self.doctree, profile))
+        self.assertEqual(
+            [(str(s.step), s.visited) for s in profile.steps],
+            [('root::node', 1), ('descendant::element', 1)])
+
+        detached = nodes.section(ids=['k'], names=['k'])
+        detached.append(nodes.section(ids=['l']))
+        self.assertEqual(
+            len(list(path('.//*[@ids == "l"]').findall(detached))), 1)
+
+        document = new_document('<test>')
+        document.append(detached)
+        self.assertEqual(
+            len(list(path('//*[@ids == "l"]').findall(document))), 1)
+
+
+class subsection(nodes.section):
+    pass
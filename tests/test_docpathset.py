@@ -0,0 +1,118 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from docpath import DocpathSet, DocumentIndex, path
+from docpath.axis import Attribute
+from docutils import nodes
+from docutils.core import publish_doctree
+from os.path import dirname, join
+from unittest import TestCase
+
+
+class TestDocpathSet(TestCase):
+
+    docpaths = [
+        '//section',
+        '//section/title',
+        '//section/title/text',
+        '//section[title == "K"]',
+        '//section[@ids]/@ids',
+        '//section[1]',
+        '//paragraph',
+        '//title[last()]',
+        '//text',
+        '//node',
+        '//*',
+        '/section',
+        '//@names',
+        '(//title|//paragraph)',
+        'section/title',
+        './/section',
+        '..//section',
+        '//unknown',
+        ]
+
+    def setUp(self):
+        source = join(dirname(__file__), 'doc', 'doctree.rst')
+        with open(source, 'r', encoding='utf-8') as rst:
+            self.doctree = publish_doctree(rst.read())
+        self.node = self.doctree.next_node(self._matches_node_i)
+
+    @staticmethod
+    def _matches_node_i(node):
+        return not isinstance(node, nodes.Text) and node['names'] == ['i']
+
+    @staticmethod
+    def _identities(nodes):
+        return [
+            (id(n.parent), n.name) if isinstance(n, Attribute.Node) else id(n)
+            for n in nodes]
+
+    def assertMatchesDocpaths(self, from_node):
+        docpaths = [path(p) for p in self.docpaths]
+        results = DocpathSet(docpaths).findall(from_node)
+        self.assertEqual(len(results), len(docpaths))
+        for docpath, result in zip(docpaths, results):
+            self.assertEqual(
+                self._identities(result),
+                self._identities(docpath.findall(from_node)),
+                str(docpath))
+
+    def test_docpathset_findall(self):
+        "Test docpath set results match each docpath."
+        self.assertMatchesDocpaths(self.doctree)
+        self.assertMatchesDocpaths(self.node)
+
+    def test_docpathset_findall_index(self):
+        "Test docpath set results match each docpath with an index."
+        DocumentIndex.build(self.doctree)
+        try:
+            self.assertMatchesDocpaths(self.doctree)
+            self.assertMatchesDocpaths(self.node)
+        finally:
+            DocumentIndex.remove(self.doctree)
+
+    def test_docpathset_empty(self):
+        "Test docpath set with no docpaths."
+        self.assertEqual(DocpathSet([]).findall(self.doctree), [])
+
+    def test_docpathset_duplicates(self):
+        "Test the same docpath can be used more than once."
+        docpath = path('//section')
+        results = DocpathSet([docpath, docpath]).findall(self.doctree)
+        self.assertEqual(results[0], list(docpath.findall(self.doctree)))
+        self.assertEqual(results[1], results[0])
+
+    def test_docpathset_shared_steps(self):
+        "Test docpaths share their common steps."
+        docpathset = DocpathSet([
+            path('//section/title'), path('//section/paragraph'),
+            path('//paragraph')])
+        docpathset.findall(self.doctree)
+
+        root = docpathset._root
+        self.assertEqual(len(root.children), 1)
+        step = list(root.children.values())[0]
+        self.assertEqual(
+            [str(c.step) for c in step.children.values()],
+            ['descendant::section', 'descendant::paragraph'])
+        section = list(step.children.values())[0]
+        self.assertEqual(
+            [str(c.step) for c in section.children.values()],
+            ['child::title', 'child::paragraph'])
+
+    def test_docpathset_single_walk(self):
+        "Test descendant steps share a single walk of the document."
+        docpathset = DocpathSet([path('//section'), path('//paragraph')])
+        calls = []
+        walk = docpathset._walk
+
+        def record(branches, *args):
+            calls.append([str(b.step) for b in branches])
+            return walk(branches, *args)
+
+        docpathset._walk = record
+        docpathset.findall(self.doctree)
+        self.assertEqual(
+            [c for c in calls if c],
+            [['descendant::section', 'descendant::paragraph']])
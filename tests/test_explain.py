@@ -0,0 +1,91 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from docpath import DocumentIndex, path
+from docutils.core import publish_doctree
+from io import StringIO
+from os.path import dirname, join
+from unittest import TestCase
+
+
+class TestDocpathExplain(TestCase):
+
+    def setUp(self):
+        source = join(dirname(__file__), 'doc', 'doctree.rst')
+        with open(source, 'r', encoding='utf-8') as rst:
+            self.doctree = publish_doctree(rst.read())
+
+    def explain(self, docpath, document=None):
+        output = StringIO()
+        path(docpath).explain(document, output)
+        return [line.split() for line in output.getvalue().splitlines()]
+
+    def test_explain_plan(self):
+        "Test the steps of the plan are explained."
+        self.assertEqual(
+            self.explain('//section[title == "K"]/title'),
+            [['notes'],
+             ['root::node'],
+             ['descendant::section', 'index'],
+             ['[title', '==', '"K"]'],
+             ['child::title']])
+
+    def test_explain_lookup(self):
+        "Test predicates that look up ids and names are explained."
+        self.assertEqual(
+            self.explain(
+                '//*[@ids == "k"]/section[@names == "l"]', self.doctree),
+            [['notes', 'estimate'],
+             ['root::node', '~1'],
+             ['descendant::element', '~47'],
+             ['[attribute.ids', '==', '"k"]', 'ids', 'lookup', '~1'],
+             ['child::section', '~0'],
+             ['[attribute.names', '==', '"l"]', '~0']])
+
+    def test_explain_predicates(self):
+        "Test the context needed by predicates is explained."
+        self.assertEqual(
+            self.explain('section[position() < 3]/title[last()]')[1:],
+            [['child::section'],
+             ['[position()', '<', '3]', 'position,', 'first', '2'],
+             ['child::title'],
+             ['[last()]', 'position,', 'size']])
+
+    def test_explain_reverse(self):
+        "Test reverse axes are explained."
+        self.assertEqual(
+            self.explain('ancestor::section')[1:],
+            [['ancestor::section', 'reverse']])
+
+    def test_explain_union(self):
+        "Test the steps of unions are indented."
+        output = StringIO()
+        path('title|paragraph').explain(file=output)
+        self.assertEqual(
+            output.getvalue().splitlines()[1:],
+            ['  child::title', '  child::paragraph'])
+
+    def test_explain_estimates(self):
+        "Test the estimated number of nodes for each step."
+        self.assertEqual(
+            self.explain('//section[title == "K"]/title', self.doctree),
+            [['notes', 'estimate'],
+             ['root::node', '~1'],
+             ['descendant::section', 'no', 'index', '~21'],
+             ['[title', '==', '"K"]', '~21'],
+             ['child::title', '~21']])
+        self.assertEqual(
+            self.explain('section[1]', self.doctree)[1:],
+            [['child::section', '~5'],
+             ['[1]', 'position,', 'first', '1', '~1']])
+
+    def test_explain_index(self):
+        "Test steps that use an index are explained."
+        DocumentIndex.build(self.doctree)
+        try:
+            self.assertEqual(
+                self.explain('//section', self.doctree)[1:],
+                [['root::node', '~1'],
+                 ['descendant::section', 'index', '~21']])
+        finally:
+            DocumentIndex.remove(self.doctree)
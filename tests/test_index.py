@@ -0,0 +1,307 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from docpath import path
+from docpath.axis import Axis
+from docpath.index import DocumentIndex, DocumentOrder, DocumentPositions
+from docutils import nodes
+from docutils.core import publish_doctree
+from docutils.utils import new_document
+from os.path import dirname, join
+from unittest import TestCase
+
+
+class TestDocumentIndex(TestCase):
+
+    def setUp(self):
+        source = join(dirname(__file__), 'doc', 'doctree.rst')
+        with open(source, 'r', encoding='utf-8') as rst:
+            self.doctree = publish_doctree(rst.read())
+        self.node = self.doctree.next_node(self._matches_node_i)
+        self.index = DocumentIndex.build(self.doctree)
+        self.order = DocumentOrder.get(self.doctree)
+
+    def tearDown(self):
+        DocumentIndex.remove(self.doctree)
+
+    @staticmethod
+    def _matches_node_i(node):
+        return not isinstance(node, nodes.Text) and node['names'] == ['i']
+
+    def assertNames(self, node_addresses, matches):
+        names = [', '.join(n['names']) for n, _ in node_addresses]
+        self.assertEqual(names, matches)
+
+    def test_index_get(self):
+        "Test the index is found for nodes in the indexed document."
+        self.assertIs(DocumentIndex.get(self.node), self.index)
+        self.assertIs(DocumentIndex.get(self.node[0][0]), self.index)
+        self.assertIsNone(DocumentIndex.get(nodes.section()))
+
+    def test_index_count(self):
+        "Test the index counts the nodes by name."
+        self.assertEqual(
+            len(self.index),
+            len(list(Axis('descendant_or_self').traverse(self.doctree))))
+        self.assertEqual(self.index.count('section'), 21)
+        self.assertEqual(self.index.count('bullet_list'), 0)
+
+    def test_index_descendants(self):
+        "Test the descendants of a node are found in document order."
+        self.assertNames(
+            self.index.descendants(self.order, self.node, 'section'),
+            ['j', 'k', 'l', 'm', 'n', 'o', 'p', 'q', 'r'])
+        self.assertNames(
+            self.index.descendants(
+                self.order, self.node, 'section', include_self=True),
+            ['i', 'j', 'k', 'l', 'm', 'n', 'o', 'p', 'q', 'r'])
+
+    def test_index_descendants_addresses(self):
+        "Test the addresses of the indexed nodes are correct."
+        for node, address in self.index.descendants(
+                self.order, self.doctree, 'title'):
+            self.assertEqual(address, self.order.number(node))
+
+    def test_index_descendants_unknown_node(self):
+        "Test looking up the descendants of a node that is not indexed."
+        self.node.append(nodes.section())
+        self.assertNames(
+            self.index.descendants(self.order, self.node[-1], 'section'), [])
+        self.assertEqual(self.index.count('section'), 22)
+
+    def test_index_docpath(self):
+        "Test docpaths use the index for descendant steps."
+        self.assertEqual(
+            [', '.join(n['names']) for n in path('//section').findall(
+                self.node)],
+            ['c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm', 'n', 'o',
+             'p', 'q', 'r', 's', 't', 'u', 'v', 'w'])
+        self.assertEqual(
+            [n.astext() for n in path('descendant::text').findall(
+                self.node)],
+            ['I', 'J', 'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R'])
+
+    def test_index_notify(self):
+        "Test the index is updated when the document is changed."
+        generation = self.order.generation
+        section = nodes.section(names=['x'])
+        self.node[2].append(section)
+        DocumentOrder.notify_inserted(section)
+        self.assertEqual(self.index.count('section'), 22)
+
+        old = self.node[1]
+        old.parent.remove(old)
+        DocumentOrder.notify_removed(self.node, old)
+        self.assertEqual(self.index.count('section'), 21)
+
+        self.assertNames(
+            self.index.descendants(self.order, self.node, 'section'),
+            ['k', 'l', 'm', 'x', 'n', 'o', 'p', 'q', 'r'])
+        self.assertEqual(self.order.generation, generation)
+        self.assertEqual(self.index._generation, generation)
+
+    def test_index_docpath_stale(self):
+        "Test docpaths use the document as indexed."
+        self.node.append(nodes.section(names=['x']))
+        self.assertEqual(
+            [', '.join(n['names']) for n in path(
+                'descendant::section').findall(self.node)],
+            ['j', 'k', 'l', 'm', 'n', 'o', 'p', 'q', 'r'])
+        DocumentIndex.build(self.doctree)
+        self.assertEqual(
+            [', '.join(n['names']) for n in path(
+                'descendant::section').findall(self.node)],
+            ['j', 'k', 'l', 'm', 'n', 'o', 'p', 'q', 'r', 'x'])
+
+
+class TestDocumentOrder(TestCase):
+
+    def setUp(self):
+        source = join(dirname(__file__), 'doc', 'doctree.rst')
+        with open(source, 'r', encoding='utf-8') as rst:
+            self.doctree = publish_doctree(rst.read())
+        self.node = self.doctree.next_node(self._matches_node_i)
+        self.order = DocumentOrder.build(self.node)
+
+    def tearDown(self):
+        DocumentOrder.invalidate(self.doctree)
+
+    @staticmethod
+    def _matches_node_i(node):
+        return not isinstance(node, nodes.Text) and node['names'] == ['i']
+
+    def test_order_cached(self):
+        "Test the document order is cached for each document."
+        self.assertIs(DocumentOrder.get(self.doctree), self.order)
+        DocumentOrder.invalidate(self.node)
+        self.assertIsInstance(
+            DocumentOrder.get(self.doctree), DocumentPositions)
+
+    def assertOrdered(self):
+        descendants = list(Axis('descendant_or_self').traverse(self.doctree))
+        numbers = [self.order.number(n) for n in descendants]
+        self.assertEqual(numbers, sorted(set(numbers)))
+        self.assertEqual(len(self.order), len(descendants))
+        for node in descendants:
+            last = ([node] + list(Axis('descendant').traverse(node)))[-1]
+            self.assertEqual(
+                self.order.end(self.order.number(node)),
+                self.order.number(last))
+
+    def test_order_number(self):
+        "Test nodes are numbered in document order."
+        self.assertOrdered()
+        self.assertIs(self.order.node(self.order.number(self.node)), self.node)
+
+    def test_order_end(self):
+        "Test the end of a node's subtree is numbered."
+        number = self.order.number(self.node)
+        last = list(Axis('descendant').traverse(self.node))[-1]
+        self.assertEqual(self.order.end(number), self.order.number(last))
+
+    def test_order_key_attribute(self):
+        "Test attribute nodes are ordered with their element."
+        attribute = next(Axis('attribute').traverse(self.node))
+        self.assertEqual(
+            self.order.key(attribute), self.order.number(self.node))
+
+    def test_order_new_node(self):
+        "Test the order is rebuilt when a new node is found."
+        self.node.insert(0, nodes.section())
+        generation = self.order.generation
+        self.assertGreater(
+            self.order.number(self.node[0]), self.order.number(self.node))
+        self.assertLess(
+            self.order.number(self.node[0]), self.order.number(self.node[1]))
+        self.assertEqual(self.order.generation, generation + 1)
+
+    def test_order_notify_inserted(self):
+        "Test inserted nodes are numbered without renumbering the document."
+        generation = self.order.generation
+        section = nodes.section('', nodes.title('', 'X'), names=['x'])
+        self.node.insert(2, section)
+        DocumentOrder.notify_inserted(section)
+        self.node.append(nodes.paragraph('', 'Y'))
+        DocumentOrder.notify_inserted(self.node[-1])
+        self.doctree.append(nodes.paragraph('', 'Z'))
+        DocumentOrder.notify_inserted(self.doctree[-1])
+        self.assertOrdered()
+        self.assertEqual(self.order.generation, generation)
+        self.assertEqual(
+            [', '.join(n['names']) for n in path(
+                'following_sibling::section').findall(section)],
+            ['k', 'n', 'o', 'p'])
+
+    def test_order_notify_inserted_full(self):
+        "Test the document is renumbered when there is no room for nodes."
+        generation = self.order.generation
+        for _ in range(20):
+            self.node.insert(1, nodes.paragraph())
+            DocumentOrder.notify_inserted(self.node[1])
+        self.assertOrdered()
+        self.assertGreater(self.order.generation, generation)
+
+    def test_order_notify_removed(self):
+        "Test removed nodes are no longer numbered."
+        generation = self.order.generation
+        removed = [self.node[-1], self.node[2]]
+        for node in removed:
+            self.node.remove(node)
+            DocumentOrder.notify_removed(self.node, node)
+        self.assertOrdered()
+        self.assertEqual(self.order.generation, generation)
+        for node in removed:
+            with self.assertRaises(ValueError):
+                self.order.number(node)
+
+    def test_order_notify_replaced(self):
+        "Test replaced nodes are numbered in place of the old nodes."
+        generation = self.order.generation
+        old = self.node[1]
+        new = nodes.section('', nodes.title('', 'X'), names=['x'])
+        old.replace_self(new)
+        DocumentOrder.notify_replaced(old, new)
+        self.assertOrdered()
+        self.assertEqual(self.order.generation, generation)
+        self.assertEqual(
+            [', '.join(n['names']) for n in path('section').findall(
+                self.node)],
+            ['x, j', 'k', 'n', 'o', 'p'])
+
+    def test_order_unknown_node(self):
+        "Test numbering a node that is not in the document."
+        with self.assertRaises(ValueError):
+            self.order.number(nodes.section())
+
+
+class TestDocumentPositions(TestCase):
+
+    def setUp(self):
+        source = join(dirname(__file__), 'doc', 'doctree.rst')
+        with open(source, 'r', encoding='utf-8') as rst:
+            self.doctree = publish_doctree(rst.read())
+        self.node = self.doctree.next_node(self._matches_node_i)
+        self.order = DocumentOrder.get(self.node)
+
+    @staticmethod
+    def _matches_node_i(node):
+        return not isinstance(node, nodes.Text) and node['names'] == ['i']
+
+    def test_positions_key(self):
+        "Test nodes are ordered by their positions in the document."
+        descendants = list(Axis('descendant_or_self').traverse(self.doctree))
+        keys = [self.order.key(n) for n in descendants]
+        self.assertEqual(keys, sorted(set(keys)))
+        attribute = next(Axis('attribute').traverse(self.node))
+        self.assertEqual(
+            self.order.key(attribute), self.order.key(self.node))
+
+    def test_positions_end(self):
+        "Test the end of a node's subtree comes before the following nodes."
+        end = self.order.end(self.order.key(self.node))
+        for node in Axis('descendant').traverse(self.node):
+            self.assertLess(self.order.key(node), end)
+        for node in Axis('following').traverse(self.node):
+            self.assertGreater(self.order.key(node), end)
+
+    def test_positions_other_tree(self):
+        "Test nodes from another tree are ordered after the document."
+        section = nodes.section('', nodes.title('', 'X'))
+        last = list(Axis('descendant_or_self').traverse(self.doctree))[-1]
+        self.assertGreater(
+            self.order.key(section[0]),
+            self.order.end(self.order.key(last)))
+        self.assertGreater(
+            self.order.key(section[0]), self.order.key(section))
+
+    def test_positions_deep_copy(self):
+        "Test absolute docpaths from a detached copy search its document."
+        titles = list(path('//title').findall(self.doctree))
+        copy = self.node.deepcopy()
+        self.assertIsNone(copy.parent)
+        self.assertEqual(list(path('//title').findall(copy)), titles)
+        self.assertEqual(
+            [n.astext() for n in path('title | /title').findall(copy)],
+            ['I', 'A'])
+
+    def test_positions_moved_node(self):
+        "Test docpaths find moved nodes in their new place."
+        document = new_document('<moved>')
+        for name in ['a', 'b']:
+            document += nodes.section(
+                '', nodes.title('', name.upper()), nodes.paragraph('', name))
+        docpath = path('//title | //paragraph')
+        self.assertEqual(
+            [n.astext() for n in docpath.findall(document)],
+            ['A', 'a', 'B', 'b'])
+
+        section = document[0]
+        document.remove(section)
+        document.append(section)
+        self.assertEqual(
+            [n.astext() for n in docpath.findall(document)],
+            ['B', 'b', 'A', 'a'])
+        self.assertEqual(
+            [n.astext() for n in path(
+                '//paragraph/preceding::title').findall(document)],
+            ['B', 'A'])
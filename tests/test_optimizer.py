@@ -0,0 +1,130 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from docpath import path
+from docpath.axis import Attribute, Axis
+from docpath.docpath import Docpath, DocpathStep
+from docpath.optimizer import DocpathOptimizer
+from docpath.parser import DocpathParser
+from docutils.core import publish_doctree
+from os.path import dirname, join
+from unittest import TestCase
+
+
+class TestDocpathOptimizer(TestCase):
+
+    def setUp(self):
+        source = join(dirname(__file__), 'doc', 'doctree.rst')
+        with open(source, 'r', encoding='utf-8') as rst:
+            self.doctree = publish_doctree(rst.read())
+
+    def assertOptimized(self, docpath, optimized, from_node=None):
+        docpath = DocpathParser.parse(docpath)
+        self.assertEqual(str(Docpath(docpath.plan)), optimized)
+
+        if from_node is None:
+            from_node = self.doctree
+        try:
+            Docpath.optimize = False
+            expected = self._identities(docpath.findall(from_node))
+        finally:
+            Docpath.optimize = True
+        self.assertEqual(
+            self._identities(docpath.findall(from_node)), expected)
+
+    @staticmethod
+    def _identities(nodes):
+        return [
+            (id(n.parent), n.name) if isinstance(n, Attribute.Node) else id(n)
+            for n in nodes]
+
+    def test_optimizer_descendant(self):
+        "Test descendant or self and child steps are combined."
+        self.assertOptimized('//section', '/descendant::section')
+        self.assertOptimized(
+            '//section//title', '/descendant::section/descendant::title')
+
+    def test_optimizer_descendant_predicate(self):
+        "Test descendant or self and child steps with predicates."
+        self.assertOptimized(
+            '//section[title == "K"]', '/descendant::section[title == "K"]')
+        self.assertOptimized(
+            '//section[@ids]', '/descendant::section[attribute.ids]')
+        self.assertOptimized(
+            '//section[./section]',
+            '/descendant::section[self.node/section]')
+
+    def test_optimizer_descendant_positional(self):
+        "Test descendant or self and child steps with position predicates."
+        self.assertOptimized(
+            '//section[1]', '/descendant_or_self::node/child::section[1]')
+        self.assertOptimized(
+            '//section[last()]',
+            '/descendant_or_self::node/child::section[last()]')
+        self.assertOptimized(
+            '//section[position() > 1 and title]',
+            '/descendant_or_self::node/child::section'
+            '[position() > 1 and title]')
+        self.assertOptimized(
+            '//section[count(section)]',
+            '/descendant_or_self::node/child::section[count(section)]')
+
+    def test_optimizer_descendant_other_axis(self):
+        "Test descendant or self steps are not combined with other axes."
+        self.assertOptimized(
+            '//@ids', '/descendant_or_self::node/attribute::ids')
+        self.assertOptimized(
+            '/descendant_or_self::node[2]/section',
+            '/descendant_or_self::node[2]/child::section')
+
+    def test_optimizer_self(self):
+        "Test self node steps are removed."
+        self.assertOptimized('./section', 'child::section')
+        self.assertOptimized('//./section', '/descendant::section')
+        self.assertOptimized('.', 'self::node')
+        self.assertOptimized('.[1]', 'self::node[1]')
+
+    def test_optimizer_self_attribute(self):
+        "Test self node steps are kept for attribute context nodes."
+        self.assertOptimized(
+            '//section/@ids/.',
+            '/descendant::section/attribute::ids/self::node')
+        self.assertOptimized(
+            '//section/@names/./..',
+            '/descendant::section/attribute::names/self::node/parent::node')
+        self.assertOptimized(
+            '//section/(@ids|title)/.',
+            '/descendant::section/(attribute::ids|child::title)/self::node')
+        self.assertOptimized(
+            '//section/@ids/./section',
+            '/descendant::section/attribute::ids/child::section')
+        self.assertEqual(
+            list(path('//section/@ids/.').findall(self.doctree)), [])
+
+        attribute = next(Axis('attribute').traverse(self.doctree[0]))
+        self.assertOptimized('.', 'self::node', attribute)
+        self.assertOptimized('./..', 'self::node/parent::node', attribute)
+        self.assertOptimized('./section', 'child::section', attribute)
+
+    def test_optimizer_flatten(self):
+        "Test nested steps are flattened."
+        steps = [
+            DocpathStep(Axis('root'), 'node'),
+            [DocpathStep(Axis('descendant_or_self'), 'node'),
+             [DocpathStep(Axis('child'), 'section')]],
+            ((DocpathStep(Axis('child'), 'title'),
+              DocpathStep(Axis('child'), 'section')),
+             DocpathStep(Axis('self'), 'node'))]
+        self.assertEqual(
+            str(Docpath(DocpathOptimizer.optimize(steps))),
+            '/descendant::section/(child::title|child::section|self::node)')
+
+    def test_optimizer_disabled(self):
+        "Test the optimizer can be disabled."
+        docpath = path('//section')
+        try:
+            Docpath.optimize = False
+            self.assertIs(docpath.plan, docpath.steps)
+        finally:
+            Docpath.optimize = True
+        self.assertIsNot(docpath.plan, docpath.steps)
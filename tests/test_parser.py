@@ -2,6 +2,7 @@
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
 from docpath import path
+from docpath.parser import DocpathParser
 from unittest import TestCase
 
 
@@ -70,3 +71,56 @@ class TestDocpathParser(TestCase):
         self.assertEqual(
             str(docpath),
             'child::node/(child::section|child::paragraph)/child::node')
+
+    def test_parser_normalize(self):
+        "Test abbreviated paths are normalized."
+        self.assertEqual(
+            DocpathParser.normalize('//section/../@ids'),
+            '/descendant_or_self::node/child::section/parent::node'
+            '/attribute::ids')
+        self.assertEqual(
+            DocpathParser.normalize('./ * [1]'),
+            'self::node/child::element[1]')
+
+    def test_parser_nested_predicates(self):
+        "Test predicates containing brackets and quoted brackets."
+        docpath = path('section[title[1] == "a]"][@names == \'[\']')
+        self.assertEqual(
+            str(docpath),
+            'child::section[title[1] == "a]"][attribute.names == \'[\']')
+
+    def test_parser_syntax_error(self):
+        "Test syntax errors report the position of the offending token."
+        for docpath, position in [
+                ('', 0), ('section/', 8), ('section//|title', 9),
+                ('(section', 8), ('section)', 7), ('child::', 7),
+                ('section title', 8), ('section#', 7)]:
+            with self.assertRaisesRegex(
+                    ValueError, "syntax error in docpath '{}' at position "
+                    "{}$".format(docpath.replace('(', r'\(').replace(
+                        ')', r'\)'), position)):
+                path(docpath)
+
+    def test_parser_unterminated_predicate(self):
+        "Test unterminated predicates report where they start."
+        with self.assertRaisesRegex(
+                ValueError, "unterminated predicate in docpath "
+                r"'section\[1\]\[title\[1\]' at position 10"):
+            path('section[1][title[1]')
+
+    def test_parser_unknown_axis(self):
+        "Test unknown axes are rejected."
+        with self.assertRaisesRegex(ValueError, "unknown axis 'sibling'"):
+            path('sibling::section')
+
+    def test_parser_id(self):
+        "Test docpath creation from the id function."
+        self.assertEqual(str(path('id("i")/title')), 'id::i/child::title')
+        self.assertEqual(str(path("id('i j')")), '(id::i|id::j)')
+        self.assertEqual(str(path('id::child')), 'id::child')
+        for docpath, position in [
+                ('id("")', 3), ('id(i)', 3), ('id("1")', 3),
+                ('name("i")', 0)]:
+            with self.assertRaisesRegex(
+                    ValueError, "at position {}$".format(position)):
+                path(docpath)
@@ -1,12 +1,17 @@
 # This file is part of the docpath package.
 # Please see the COPYRIGHT and README.rst files at the top level of this
 # repository for full copyright notices, license terms and support information.
+from docpath import path
 from docpath.axis import Axis
 from docpath.docpath import Docpath, DocpathStep
-from docpath.predicate import Predicate
+from docpath.predicate import (
+    Constant, Predicate, PredicateCompiler, TextCache)
 from docutils import nodes
 from docutils.core import publish_doctree
 from os.path import dirname, join
+from simpleeval import (
+    FeatureNotAvailable, FunctionNotDefined, IterableTooLong)
+from types import SimpleNamespace
 from unittest import TestCase
 
 
@@ -152,3 +157,211 @@ class TestPredicate(TestCase):
         self.assertPredicateRaises(
             Axis('child'), [Predicate('@attribute = "Q"')],
             SyntaxError)
+
+    def test_predicate_compiled_once(self):
+        "Test a predicate is only compiled once."
+        predicate = Predicate('./section == "Q"')
+        self.assertPredicate(Axis('child'), [predicate], ['p'])
+        evaluator = predicate.evaluator
+        self.assertPredicate(Axis('child'), [predicate], ['p'])
+        self.assertIs(predicate.evaluator, evaluator)
+
+    def test_predicate_compiled_constant(self):
+        "Test constant parts of a predicate are evaluated when compiled."
+        predicate = Predicate('./section')
+        self.assertIsInstance(predicate.evaluator, Constant)
+        self.assertEqual(
+            str(predicate.evaluator.value), 'self::node/child::section')
+
+    def test_predicate_disallowed_attribute(self):
+        "Test a predicate cannot access private attributes."
+        self.assertPredicateRaises(
+            Axis('child'), [Predicate('"a".__class__')],
+            FeatureNotAvailable)
+        self.assertPredicateRaises(
+            Axis('child'), [Predicate('"a".upper')],
+            FeatureNotAvailable)
+
+    def test_predicate_undefined_function(self):
+        "Test a predicate cannot call undefined functions."
+        self.assertPredicateRaises(
+            Axis('child'), [Predicate('open("file")')],
+            FunctionNotDefined)
+
+    def test_predicate_string_too_long(self):
+        "Test string literals in predicates are limited in length."
+        compiler = PredicateCompiler('')
+        self.assertEqual(
+            compiler._compile_Str(SimpleNamespace(s='title')).value, 'title')
+        with self.assertRaises(IterableTooLong):
+            compiler._compile_Str(SimpleNamespace(s='x' * 200000))
+        with self.assertRaises(IterableTooLong):
+            Predicate('"{}"'.format('x' * 200000)).compiled
+
+    def test_predicate_compiled_position(self):
+        "Test the positions a predicate can select are found when compiled."
+        compiled = [
+            Predicate(p).compiled[2:4] for p in [
+                '3', 'position() < 4', '4 >= position()', 'position() == 2',
+                '@ids and position() <= 2', 'last()', 'position() > 1',
+                'title', 'position() < last()']]
+        self.assertEqual(compiled, [
+            (False, 3), (False, 3), (False, 4), (False, 2), (False, 2),
+            (True, None), (False, None), (False, None), (True, None)])
+
+    def test_predicate_stops_early(self):
+        "Test a positional predicate stops when no more nodes can match."
+        def node_addresses():
+            for node in self.node.children:
+                yield node, None
+            raise AssertionError("too many nodes were filtered")
+
+        for predicate, matches in [
+                ('2', ['j']), ('position() < 3', ['title', 'j']),
+                ('0', [])]:
+            self.assertEqual(
+                [n.tagname for n, _ in
+                 Predicate(predicate)._filter_nodes(node_addresses())],
+                [m if m == 'title' else 'section' for m in matches])
+
+    def test_predicate_string_digits(self):
+        "Test a string of digits is not used as a position."
+        self.assertEqual(Predicate('"1"').compiled[1:4], (False, False, None))
+        self.assertPredicate(Axis('child'), [Predicate('"1"')], [])
+        self.assertEqual(
+            list(path('//section["1"]').findall(self.doctree)), [])
+        self.assertEqual(
+            len(list(path('//section[1]').findall(self.doctree))), 7)
+
+    def test_predicate_position_last(self):
+        "Test a predicate that uses both the position and size."
+        self.assertPredicate(
+            Axis('child'), [Predicate('position() < last() - 2')],
+            ['j', 'k'])
+
+    def test_predicate_text_cache(self):
+        "Test the text of nodes is cached, up to the maximum size."
+        texts = TextCache(maxsize=len(self.node.astext()))
+        section = self.node.children[1]
+        self.assertEqual(texts.astext(self.node), self.node.astext())
+        self.assertEqual(len(texts), 1)
+        texts.astext(section)
+        self.assertEqual(len(texts), 1)
+        self.assertEqual(texts.astext(section), section.astext())
+        self.assertEqual(len(texts), 1)
+
+    def test_predicate_text_cache_shared(self):
+        "Test a query only gets the text of each compared node once."
+        calls, depth = [], []
+        astext = nodes.section.astext
+
+        def record(node):
+            if not depth:
+                calls.append(node)
+            depth.append(node)
+            try:
+                return astext(node)
+            finally:
+                depth.pop()
+
+        nodes.section.astext = record
+        try:
+            self.assertPredicate(
+                Axis('child'), [Predicate('self::node == ^//section')],
+                ['j', 'k', 'n', 'o', 'p'])
+        finally:
+            nodes.section.astext = astext
+        sections = [
+            n for n in Axis('descendant').traverse(self.doctree)
+            if isinstance(n, nodes.section)]
+        self.assertEqual(len(calls), len(sections))
+        self.assertEqual(set(map(id, calls)), set(map(id, sections)))
+
+    def test_predicate_absolute_once(self):
+        "Test an absolute docpath in a comparison is only traversed once."
+        calls = []
+        traverse_from = Docpath._traverse_from
+
+        def record(docpath, *args, **kwargs):
+            if docpath.absolute:
+                calls.append(str(docpath))
+            return traverse_from(docpath, *args, **kwargs)
+
+        Docpath._traverse_from = record
+        try:
+            self.assertPredicate(
+                Axis('child'), [Predicate('title == ^//section/title')],
+                ['j', 'k', 'n', 'o', 'p'])
+            self.assertPredicate(
+                Axis('child'), [Predicate('^//section/title != title')],
+                [])
+            self.assertPredicate(
+                Axis('descendant'), [Predicate('title < ^//section/title')],
+                ['j', 'k', 'l', 'm', 'n', 'o', 'p', 'q', 'r'])
+        finally:
+            Docpath._traverse_from = traverse_from
+        self.assertEqual(len(calls), 3)
+
+    def test_predicate_stops_counting(self):
+        "Test existence and count comparisons only find the nodes needed."
+        found = []
+        traverse_from = Docpath._traverse_from
+
+        def record(docpath, *args, **kwargs):
+            for node_address in traverse_from(docpath, *args, **kwargs):
+                found.append(str(docpath))
+                yield node_address
+
+        Docpath._traverse_from = record
+        try:
+            for predicate, matches, count in [
+                    ('descendant::section', ['k', 'p'], 2),
+                    ('count(^//section) > 2', ['j', 'k', 'n', 'o', 'p'], 15),
+                    ('2 >= count(^//section)', [], 15),
+                    ('count(^//section) == 21', ['j', 'k', 'n', 'o', 'p'],
+                     105),
+                    ('title == "N"', ['n'], 5)]:
+                found.clear()
+                self.assertPredicate(
+                    Axis('child'), [Predicate(predicate)], matches)
+                self.assertEqual(
+                    len([f for f in found
+                         if not f.startswith('child::section')]),
+                    count, predicate)
+        finally:
+            Docpath._traverse_from = traverse_from
+
+    def test_predicate_compiled_lookup(self):
+        "Test comparisons that can use the ids and names are found."
+        self.assertEqual(
+            [Predicate(p).compiled.lookup for p in [
+                '@ids == "j"', '"j" == @names', '@ids == "j k"', '@ids == ""',
+                '@ids != "j"', '@ids == "j" and title', '@refid == "j"',
+                'title == "j"']],
+            [('ids', 'j'), ('names', 'j'), None, None, None, None, None,
+             None])
+
+    def test_predicate_id(self):
+        "Test a predicate that uses the id function."
+        self.assertPredicate(
+            Axis('child'), [Predicate('id("k")/title == title')], ['k'])
+        self.assertPredicate(
+            Axis('child'), [Predicate('id("j k")')],
+            ['j', 'k', 'n', 'o', 'p'])
+        self.assertFalse(Predicate('id("k")').positional)
+        self.assertPredicateRaises(
+            Axis('child'), [Predicate('id(title)')], FeatureNotAvailable)
+
+    def test_predicate_formatted_string(self):
+        "Test a predicate that contains formatted string literals."
+        self.assertPredicate(
+            Axis('child'), [Predicate('title == f"{\'K\'}"')], ['k'])
+        self.assertPredicate(
+            Axis('child'), [Predicate('f"{position()}" == "2"')], ['k'])
+        self.assertPredicate(
+            Axis('child'), [Predicate('f"{position():02d}" == "03"')], ['n'])
+        self.assertEqual(
+            Predicate('f"{\'K\'!r}-{1:>3}"').evaluator.value, "'K'-  1")
+        self.assertPredicateRaises(
+            Axis('child'), [Predicate('f"{position()}{\'x\' * 100000}"')],
+            IterableTooLong)
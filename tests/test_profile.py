@@ -0,0 +1,84 @@
+# This file is part of the docpath package.
+# Please see the COPYRIGHT and README.rst files at the top level of this
+# repository for full copyright notices, license terms and support information.
+from docpath import DocpathProfile, DocumentIndex, path
+from docutils.core import publish_doctree
+from os.path import dirname, join
+from unittest import TestCase
+
+
+class TestDocpathProfile(TestCase):
+
+    def setUp(self):
+        source = join(dirname(__file__), 'doc', 'doctree.rst')
+        with open(source, 'r', encoding='utf-8') as rst:
+            self.doctree = publish_doctree(rst.read())
+        self.profile = DocpathProfile()
+
+    def assertProfiled(self, docpath):
+        docpath = path(docpath)
+        result = list(docpath.traverse(self.doctree, self.profile))
+        self.assertEqual(result, list(docpath.traverse(self.doctree)))
+        return result
+
+    def test_profile_steps(self):
+        "Test the nodes counted for each step."
+        self.assertProfiled('//section[title == "K"]/title')
+        self.assertEqual(
+            [str(s.step) for s in self.profile.steps],
+            ['root::node', 'descendant::section', 'child::title'])
+
+        step = self.profile.steps[1]
+        self.assertEqual(step.contexts, 1)
+        self.assertEqual(step.matched, 21)
+        self.assertGreater(step.visited, step.matched)
+        self.assertEqual(step.results, 1)
+        self.assertGreater(step.time, 0)
+
+        step = self.profile.steps[2]
+        self.assertEqual(
+            (step.contexts, step.visited, step.matched, step.results),
+            (1, 3, 1, 1))
+
+    def test_profile_predicates(self):
+        "Test the nodes counted for each predicate."
+        self.assertProfiled('//section[title == "K"]')
+        predicate, = self.profile.predicates
+        self.assertEqual(str(predicate.predicate), 'title == "K"')
+        self.assertEqual((predicate.evaluated, predicate.results), (21, 1))
+
+    def test_profile_positional(self):
+        "Test positional predicates are counted for each context node."
+        self.assertProfiled('//section[2]')
+        predicate, = self.profile.predicates
+        self.assertEqual((predicate.evaluated, predicate.results), (12, 5))
+
+    def test_profile_index(self):
+        "Test indexed steps only visit the matching nodes."
+        DocumentIndex.build(self.doctree)
+        try:
+            self.assertProfiled('//section')
+        finally:
+            DocumentIndex.remove(self.doctree)
+        step = self.profile.steps[-1]
+        self.assertEqual((step.visited, step.matched), (21, 21))
+
+    def test_profile_accumulates(self):
+        "Test a profile accumulates the counts of several traversals."
+        self.assertProfiled('//section')
+        self.assertProfiled('//section')
+        self.assertEqual(len(self.profile.steps), 2)
+        self.assertEqual(self.profile.steps[-1].results, 42)
+
+    def test_profile_table(self):
+        "Test the profile table."
+        self.assertProfiled('(//title|//section)[1]')
+        lines = str(self.profile).splitlines()
+        self.assertEqual(
+            lines[0].split(),
+            ['contexts', 'visited', 'matched', 'evaluated', 'results', 'ms'])
+        self.assertEqual(
+            [line.split()[0] for line in lines[1:]],
+            ['root::node', 'descendant::title', 'root::node',
+             'descendant::section', '[1]'])
+        self.assertEqual(len(set(len(line) for line in lines)), 1)